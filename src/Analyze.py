@@ -0,0 +1,123 @@
+"""
+Bulk position analysis, one JSON line per input position
+
+Positions are read one per line in the text notation of Position.from_text,
+e.g. "kqbn1/2pp1/5/1PP2/1NBQK w". Blank lines and lines starting with # are
+skipped. Every position is searched in a worker process with a fresh engine,
+so a result never depends on which positions the worker saw before it.
+
+Input is read and output written as the work goes: at most `window` positions
+are in flight, and results are written in input order as soon as the oldest
+one is done. Memory stays constant however long the input is.
+
+    {"position": "...", "move": "b2b3", "score": 0.3, "depth": 5, "pv": ["b2b3", ...], "nodes": 1234, "time_ms": 56}
+
+A line that cannot be read gives {"position": "...", "error": "..."} instead.
+"""
+import os
+import sys
+import json
+import time
+import argparse
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from Engine import format_move
+from Position import Position, WHITE
+from Tournament import EngineConfig
+
+ANALYSIS_ENGINE: str = "heuristic=e2,depth=5"
+
+_config = None
+
+def _init_worker(config):
+    global _config
+    _config = config
+
+"""
+Search one position with the worker's engine configuration
+
+Args:
+    - text: string | Position in the text notation
+Returns:
+    - result: dict | Best move, score from white's point of view, depth, PV, nodes and time,
+                     move and score are None and pv empty when the game is over or there is no move
+"""
+def analyze(text, config=None):
+    config = config or _config
+    try:
+        position = Position.from_text(text)
+    except ValueError as error:
+        return {"position": text, "error": str(error)}
+
+    engine = config.build()
+    start = time.time()
+    move = None if position.outcome else engine.find_move(position, config.depth, position.turn == WHITE)
+    seconds = time.time() - start
+    pv = [notation.replace(" ", "").lower() for notation in engine.principal_variation()] if move else []
+    if move and pv[:1] != [format_move(move)]:
+        pv = [format_move(move)]
+    return {
+        "position": text,
+        "move": format_move(move) if move else None,
+        "score": engine.root_score if move else None,
+        "depth": engine.depth_reached if move else 0,
+        "pv": pv,
+        "nodes": engine.total_nodes if move else 0,
+        "time_ms": round(seconds * 1000),
+    }
+
+"""
+Analyze a stream of positions in a process pool and write JSON lines in input order
+
+Args:
+    - lines:        iterable | Input lines, read lazily
+    - out:          file | Where the JSON lines go, flushed after each one
+    - config:       EngineConfig | Heuristic and depth or time per position
+    - processes:    int | Worker processes, None for one per core
+    - window:       int | Most positions in flight, None for four per process
+Returns:
+    - count: int | Positions written
+"""
+def run(lines, out, config, processes=None, window=None):
+    count = 0
+    with ProcessPoolExecutor(max_workers=processes, initializer=_init_worker, initargs=(config,)) as pool:
+        window = window or 4 * (processes or os.cpu_count())
+        pending = deque()
+
+        def write(future):
+            out.write(json.dumps(future.result()) + "\n")
+            out.flush()
+
+        for line in lines:
+            text = line.strip()
+            if not text or text.startswith("#"):
+                continue
+            if len(pending) >= window:
+                write(pending.popleft())
+            pending.append(pool.submit(analyze, text))
+            count += 1
+        while pending:
+            write(pending.popleft())
+    return count
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Analyze positions from a file or stdin, one JSON line per position")
+    parser.add_argument("input", type=str, nargs="?", default="-", help="Positions in the text notation, one per line (default: stdin)")
+    parser.add_argument("--output", type=str, default="-", help="JSON lines output file (default: stdout)")
+    parser.add_argument("--engine", type=EngineConfig.argument, default=ANALYSIS_ENGINE,
+                        help=f"Engine options, depth=N for a fixed depth or time=S for iterative deepening (default: {ANALYSIS_ENGINE})")
+    parser.add_argument("--processes", type=int, default=None, help="Worker processes (default: one per core)")
+    parser.add_argument("--window", type=int, default=None, help="Most positions in flight (default: four per process)")
+    args = parser.parse_args()
+
+    source = sys.stdin if args.input == "-" else open(args.input)
+    out = sys.stdout if args.output == "-" else open(args.output, "w")
+    start = time.time()
+    try:
+        count = run(source, out, args.engine, args.processes, args.window)
+    finally:
+        if source is not sys.stdin:
+            source.close()
+        if out is not sys.stdout:
+            out.close()
+    print(f'{count} positions in {time.time() - start:.1f}s', file=sys.stderr)
@@ -0,0 +1,373 @@
+import os
+import sys
+import math
+import json
+import time
+import argparse
+from Heuristics import HeuristicsEvaluator, HEURISTICS
+from MiniChess import MiniChess
+from Minimax import Minimax, QUIESCENCE_NODES
+from MoveOrdering import MoveOrderer
+from Parallel import measure_speedup
+from Position import Position, decode_move
+from TranspositionTable import TranspositionTable
+
+"""
+Fixed positions for perft, in the compact text notation of Position.from_text,
+with the depth each one is counted to
+"""
+PERFT_POSITIONS: dict = {
+    "start":      ("kqbn1/2pp1/5/1PP2/1NBQK w", 6),
+    "open":       ("k1bn1/2p2/N1qpB/2P1K/3Q1 w", 5),
+    "crowded":    ("bq1n1/k1p2/1P2B/2P1K/1N1Q1 w", 5),
+    "black":      ("k1b2/2ppq/2n2/1PP1Q/4K b", 5),
+    "promotions": ("k4/2P2/5/2p2/4K w", 7),
+}
+# The dictionary generator is much slower, it is cross-checked this many plies shallower
+LEGACY_DEPTH_OFFSET: int = 1
+
+SEARCH_POSITION: str = "kqbn1/2pp1/5/1PP2/1NBQK w"
+SEARCH_DEPTHS: dict = {True: 6, False: 4} # keyed by use_alpha_beta
+BATCH_POSITION: str = "k1bn1/2p2/N1qpB/2P1K/3Q1 w"
+BATCH_DEPTH: int = 4
+PARALLEL_DEPTH: int = 8
+PARALLEL_WORKERS: int = 2
+
+BASELINE: str = os.path.join(os.path.dirname(os.path.abspath(__file__)), "bench_baseline.json")
+TIME_TOLERANCE: float = 0.5 # timings may be this much slower than the baseline before they are flagged
+
+"""
+Count the leaf nodes of the move tree to a fixed depth on the compact Position.
+A game that ended on a king capture has no further moves.
+"""
+def perft(position, depth):
+    if depth == 0:
+        return 1
+    if position.outcome:
+        return 0
+    if depth == 1:
+        return len(position.valid_moves())
+    nodes = 0
+    for move in position.valid_moves():
+        undo = position.make_move(move)
+        nodes += perft(position, depth - 1)
+        position.unmake_move(move, undo)
+    return nodes
+
+"""
+Same count on the dictionary state through the MiniChess generators, the correctness oracle for Position
+"""
+def legacy_perft(game, game_state, depth):
+    if depth == 0:
+        return 1
+    if game_state["outcome"]:
+        return 0
+    nodes = 0
+    for move in game.valid_moves(game_state):
+        undo = game.make_move(game_state, move)
+        nodes += legacy_perft(game, game_state, depth - 1)
+        game.unmake_move(game_state, move, undo)
+    return nodes
+
+def bench_perft(game, quick):
+    results = {}
+    for name, (text, depth) in PERFT_POSITIONS.items():
+        depth -= quick
+        position = Position.from_text(text)
+        start = time.time()
+        nodes = perft(position, depth)
+        seconds = time.time() - start
+
+        legacy_depth = depth - LEGACY_DEPTH_OFFSET
+        legacy_nodes = legacy_perft(game, position.to_state(), legacy_depth)
+        results[name] = {
+            "position": text,
+            "depth": depth,
+            "nodes": nodes,
+            "seconds": seconds,
+            "legacy_depth": legacy_depth,
+            "legacy_nodes": legacy_nodes,
+            "legacy_matches": legacy_nodes == perft(position, legacy_depth),
+        }
+    return results
+
+"""
+Move generation throughput, make/generate/unmake over the start position tree
+"""
+def bench_movegen(quick):
+    position = Position.from_text(PERFT_POSITIONS["start"][0])
+    depth = 4 if quick else 5
+    start = time.time()
+    nodes = perft(position, depth)
+    seconds = time.time() - start
+    return {"depth": depth, "nodes": nodes, "seconds": seconds, "nodes_per_second": nodes / seconds}
+
+"""
+Fixed-depth search from SEARCH_POSITION for each heuristic, with and without alpha-beta
+
+Every benchmark runs e4 with DEFAULT_WEIGHTS, a local weights file does not change the results.
+"""
+def bench_search(quick):
+    results = {}
+    for heuristic in HEURISTICS:
+        for use_alpha_beta in (True, False):
+            depth = SEARCH_DEPTHS[use_alpha_beta] - quick
+            evaluator = HeuristicsEvaluator(None, heuristic, weights=None)
+            engine = Minimax(None, evaluator, use_alpha_beta, 0, "dfs", depth,
+                             TranspositionTable(16) if use_alpha_beta else None,
+                             MoveOrderer() if use_alpha_beta else None)
+            position = Position.from_text(SEARCH_POSITION)
+            start = time.time()
+            move = engine.find_move(position, depth, position.turn > 0)
+            seconds = time.time() - start
+            results[f'{heuristic}/{"ab" if use_alpha_beta else "minimax"}'] = {
+                "depth": depth,
+                "move": engine.convert_to_notation(*decode_move(move)),
+                "nodes": engine.total_nodes,
+                "seconds": seconds,
+                "nodes_per_second": engine.total_nodes / seconds,
+            }
+    return results
+
+"""
+Alpha-beta against principal variation search, iterative deepening to the
+alpha-beta search depth from SEARCH_POSITION for each heuristic
+
+The default engine (transposition table, quiescence) is compared for node
+savings. Its table and its delta-pruned quiescence give scores that depend on
+the search window, so a different move there is only a warning. The exact
+run has neither and must give the same move and score.
+"""
+def bench_pvs(quick):
+    results = {}
+    for heuristic in HEURISTICS:
+        depth = SEARCH_DEPTHS[True] - quick
+        for name, tt_mb, qs_nodes in (("default", 16, QUIESCENCE_NODES), ("exact", 0, 0)):
+            runs = {}
+            for pvs in (False, True):
+                evaluator = HeuristicsEvaluator(None, heuristic, weights=None)
+                engine = Minimax(None, evaluator, True, math.inf, "dfs", depth,
+                                 TranspositionTable(tt_mb) if tt_mb else None, MoveOrderer(), None, qs_nodes,
+                                 None, False, pvs)
+                position = Position.from_text(SEARCH_POSITION)
+                start = time.time()
+                move = engine.find_move(position, None, position.turn > 0)
+                runs[pvs] = (engine.convert_to_notation(*decode_move(move)), engine.root_score,
+                             engine.total_nodes, time.time() - start)
+            results[f'{heuristic}/{name}'] = {
+                "depth": depth,
+                "move": runs[False][0],
+                "pvs_move": runs[True][0],
+                "score": runs[False][1],
+                "pvs_score": runs[True][1],
+                "nodes": runs[False][2],
+                "pvs_nodes": runs[True][2],
+                "seconds": runs[False][3],
+                "pvs_seconds": runs[True][3],
+                "node_savings": 1 - runs[True][2] / runs[False][2],
+            }
+    return results
+
+"""
+Leaf evaluation throughput, one board at a time against evaluate_batch
+
+The boards are every leaf of the start position tree. A batch that scores any
+board differently from evaluate is reported as an error by compare.
+"""
+def bench_eval(quick):
+    boards = []
+    def collect(position, depth):
+        if depth == 0 or position.outcome:
+            boards.append(list(position.board))
+            return
+        for move in position.valid_moves():
+            undo = position.make_move(move)
+            collect(position, depth - 1)
+            position.unmake_move(move, undo)
+    collect(Position.from_text(SEARCH_POSITION), 3 if quick else 4)
+
+    results = {}
+    for heuristic in HEURISTICS:
+        evaluator = HeuristicsEvaluator(None, heuristic, weights=None)
+        start = time.time()
+        scalar = [evaluator.evaluate(Position(board)) for board in boards]
+        scalar_seconds = time.time() - start
+        start = time.time()
+        batched = evaluator.evaluate_batch(boards)
+        batch_seconds = time.time() - start
+        results[heuristic] = {
+            "boards": len(boards),
+            "scalar_seconds": scalar_seconds,
+            "batch_seconds": batch_seconds,
+            "speedup": scalar_seconds / batch_seconds,
+            "matches": scalar == batched,
+        }
+    return results
+
+"""
+Full tree engine search from BATCH_POSITION for each heuristic, leaves scored
+one at a time against --batch-eval, alpha-beta without quiescence
+
+A different move or score is reported as an error by compare, a batched search
+slower than the scalar one as a warning.
+"""
+def bench_batch(game, quick):
+    results = {}
+    for heuristic in HEURISTICS:
+        depth = BATCH_DEPTH - quick
+        runs = {}
+        for batch_eval in (False, True):
+            evaluator = HeuristicsEvaluator(game, heuristic, weights=None)
+            engine = Minimax(game, evaluator, True, 0, "tree", depth, None, MoveOrderer(), None, 0, None, batch_eval)
+            position = Position.from_text(BATCH_POSITION)
+            start = time.time()
+            move = engine.find_move(position, depth, position.turn > 0)
+            runs[batch_eval] = (engine.convert_to_notation(*decode_move(move)), engine.root_score, time.time() - start)
+        results[heuristic] = {
+            "depth": depth,
+            "move": runs[False][0],
+            "batch_move": runs[True][0],
+            "score": runs[False][1],
+            "batch_score": runs[True][1],
+            "seconds": runs[False][2],
+            "batch_seconds": runs[True][2],
+            "speedup": runs[False][2] / runs[True][2],
+        }
+    return results
+
+"""
+Time to PARALLEL_DEPTH from the start position, sequential engine against
+PARALLEL_WORKERS root-splitting workers
+
+Each worker wants a core of its own, a speedup below 1 is only reported by
+compare when the machine has that many cores.
+"""
+def bench_parallel(quick):
+    depth = PARALLEL_DEPTH - quick
+    (_, seconds, nodes, _), (workers, parallel_seconds, parallel_nodes, speedup) = \
+        measure_speedup(depth, [1, PARALLEL_WORKERS])
+    return {
+        "depth": depth,
+        "workers": workers,
+        "cores": os.cpu_count(),
+        "seconds": seconds,
+        "parallel_seconds": parallel_seconds,
+        "nodes": nodes,
+        "parallel_nodes": parallel_nodes,
+        "speedup": speedup,
+    }
+
+"""
+Compare results against the baseline
+
+Returns:
+    - (errors, warnings): tuple | Lists of messages. Errors are correctness failures,
+                                  warnings are timing regressions and changed search results
+"""
+def compare(results, baseline):
+    errors, warnings = [], []
+    for name, perft_result in results["perft"].items():
+        if not perft_result["legacy_matches"]:
+            errors.append(f'perft {name}: Position and the dictionary generators disagree at depth {perft_result["legacy_depth"]}')
+        expected = baseline.get("perft", {}).get(name)
+        if expected and expected["depth"] == perft_result["depth"] and expected["nodes"] != perft_result["nodes"]:
+            errors.append(f'perft {name}: {perft_result["nodes"]} nodes at depth {perft_result["depth"]}, baseline {expected["nodes"]}')
+
+    for name, pvs_result in results["pvs"].items():
+        if pvs_result["move"] != pvs_result["pvs_move"] or pvs_result["score"] != pvs_result["pvs_score"]:
+            message = (f'pvs {name}: {pvs_result["pvs_move"]} ({pvs_result["pvs_score"]}), '
+                       f'alpha-beta {pvs_result["move"]} ({pvs_result["score"]})')
+            (errors if name.endswith("/exact") else warnings).append(message)
+
+    for name, eval_result in results["eval"].items():
+        if not eval_result["matches"]:
+            errors.append(f'eval {name}: evaluate_batch and evaluate disagree')
+
+    for name, batch_result in results["batch"].items():
+        if batch_result["move"] != batch_result["batch_move"] or batch_result["score"] != batch_result["batch_score"]:
+            errors.append(f'batch {name}: {batch_result["batch_move"]} ({batch_result["batch_score"]}), '
+                          f'scalar {batch_result["move"]} ({batch_result["score"]})')
+        if batch_result["speedup"] < 1:
+            warnings.append(f'batch {name}: {batch_result["batch_seconds"]:.3f}s batched, {batch_result["seconds"]:.3f}s scalar')
+
+    parallel = results["parallel"]
+    if parallel["speedup"] < 1 and parallel["cores"] >= parallel["workers"]:
+        warnings.append(f'parallel: {parallel["workers"]} workers {parallel["parallel_seconds"]:.3f}s, '
+                        f'1 worker {parallel["seconds"]:.3f}s')
+
+    expected = baseline.get("movegen")
+    if expected and results["movegen"]["nodes_per_second"] * (1 + TIME_TOLERANCE) < expected["nodes_per_second"]:
+        warnings.append(f'movegen: {results["movegen"]["nodes_per_second"]:.0f} nodes/s, baseline {expected["nodes_per_second"]:.0f}')
+
+    for name, search_result in results["search"].items():
+        expected = baseline.get("search", {}).get(name)
+        if not expected or expected["depth"] != search_result["depth"]:
+            continue
+        for field in ("move", "nodes"):
+            if expected[field] != search_result[field]:
+                warnings.append(f'search {name}: {field} {search_result[field]}, baseline {expected[field]}')
+        if search_result["seconds"] > expected["seconds"] * (1 + TIME_TOLERANCE):
+            warnings.append(f'search {name}: {search_result["seconds"]:.3f}s, baseline {expected["seconds"]:.3f}s')
+    return errors, warnings
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Perft, move generation, search, PVS, evaluation, batched search and parallel speedup benchmarks")
+    parser.add_argument("--output", type=str, default="bench_results.json", help="Where to write the results (default: bench_results.json)")
+    parser.add_argument("--baseline", type=str, default=BASELINE, help="Baseline to compare against (default: bench_baseline.json next to this script)")
+    parser.add_argument("--update-baseline", action="store_true", help="Overwrite the baseline with these results")
+    parser.add_argument("--quick", action="store_true", help="One ply shallower everywhere, only comparable with a quick baseline")
+    parser.add_argument("--strict", action="store_true", help="Fail on warnings too, not only on perft errors")
+    args = parser.parse_args()
+
+    quick = int(args.quick)
+    game = MiniChess(1, 1, True, "H-H", "e0")
+    results = {
+        "perft": bench_perft(game, quick),
+        "movegen": bench_movegen(quick),
+        "search": bench_search(quick),
+        "pvs": bench_pvs(quick),
+        "eval": bench_eval(quick),
+        "batch": bench_batch(game, quick),
+        "parallel": bench_parallel(quick),
+    }
+    with open(args.output, 'w') as out:
+        json.dump(results, out, indent=2)
+
+    for name, result in results["perft"].items():
+        print(f'perft {name:<11} depth {result["depth"]}: {result["nodes"]:>9} nodes {result["seconds"]:.3f}s')
+    print(f'movegen: {results["movegen"]["nodes_per_second"]:.0f} nodes/s')
+    for name, result in results["search"].items():
+        print(f'search {name:<11} depth {result["depth"]}: {result["move"]} {result["nodes"]:>8} nodes '
+              f'{result["seconds"]:.3f}s {result["nodes_per_second"]:.0f} nodes/s')
+    for name, result in results["pvs"].items():
+        print(f'pvs {name:<11} depth {result["depth"]}: {result["nodes"]:>8} nodes alpha-beta, {result["pvs_nodes"]:>8} pvs, '
+              f'{result["node_savings"]:.1%} saved')
+    for name, result in results["eval"].items():
+        print(f'eval {name}: {result["boards"]} boards scalar {result["scalar_seconds"]:.3f}s '
+              f'batch {result["batch_seconds"]:.3f}s {result["speedup"]:.1f}x')
+    for name, result in results["batch"].items():
+        print(f'batch {name} depth {result["depth"]}: {result["move"]} scalar {result["seconds"]:.3f}s '
+              f'batch {result["batch_seconds"]:.3f}s {result["speedup"]:.2f}x')
+    result = results["parallel"]
+    print(f'parallel depth {result["depth"]}: 1 worker {result["seconds"]:.3f}s, {result["workers"]} workers '
+          f'{result["parallel_seconds"]:.3f}s {result["speedup"]:.2f}x on {result["cores"]} cores')
+
+    if args.update_baseline:
+        with open(args.baseline, 'w') as out:
+            json.dump(results, out, indent=2)
+        print(f'Baseline written to {args.baseline}')
+        sys.exit(0)
+
+    try:
+        with open(args.baseline) as baseline_file:
+            baseline = json.load(baseline_file)
+    except FileNotFoundError:
+        print(f'No baseline at {args.baseline}, run with --update-baseline to create one')
+        baseline = {}
+
+    errors, warnings = compare(results, baseline)
+    for message in errors:
+        print(f'ERROR {message}')
+    for message in warnings:
+        print(f'WARNING {message}')
+    sys.exit(1 if errors or (args.strict and warnings) else 0)
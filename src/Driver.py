@@ -0,0 +1,136 @@
+import os
+import sys
+import time
+import argparse
+import subprocess
+from Engine import format_move, parse_move
+from Position import WHITE, BLACK
+from Tournament import generate_openings, elo_difference
+
+ENGINE_SCRIPT: str = os.path.join(os.path.dirname(os.path.abspath(__file__)), "Engine.py")
+
+"""
+One engine server process, talked to over its stdin and stdout
+
+Args:
+    - spec: string | Engine options passed to Engine.py, e.g. heuristic=e2,tt_mb=64
+"""
+class EngineProcess:
+    def __init__(self, spec):
+        self.spec = spec
+        self.process = subprocess.Popen([sys.executable, ENGINE_SCRIPT, spec], stdin=subprocess.PIPE,
+                                        stdout=subprocess.PIPE, text=True, bufsize=1)
+        self.send("uci")
+        self.read_until("uciok")
+
+    def send(self, line):
+        self.process.stdin.write(line + "\n")
+        self.process.stdin.flush()
+
+    """
+    Read replies until one starts with prefix
+
+    Returns:
+        - (line, info): tuple | The matching line and the last info line before it
+    """
+    def read_until(self, prefix):
+        info = None
+        while True:
+            line = self.process.stdout.readline()
+            if not line:
+                raise RuntimeError(f"Engine {self.spec} exited")
+            line = line.strip()
+            if line.startswith(prefix):
+                return line, info
+            if line.startswith("info"):
+                info = line
+
+    """
+    Ask for a move in the position reached from opening by moves
+
+    Returns:
+        - (move, nodes): tuple | Encoded move or None, nodes searched
+    """
+    def best_move(self, opening, moves, movetime, depth):
+        self.send(f'position text {opening.to_text()}' + (f' moves {" ".join(moves)}' if moves else ''))
+        self.send(f'go movetime {movetime}' + (f' depth {depth}' if depth else ''))
+        line, info = self.read_until("bestmove")
+        text = line.split()[1]
+        fields = info.split() if info else []
+        nodes = int(fields[fields.index("nodes") + 1]) if "nodes" in fields else 0
+        return (None if text == "(none)" else parse_move(text)), nodes
+
+    def close(self):
+        self.send("quit")
+        self.process.wait()
+
+"""
+Play one game between two engine processes
+
+The turn counter and the draw rule follow Tournament.play_game.
+
+Returns:
+    - outcome: string | 'white', 'black' or 'draw', an illegal move loses
+"""
+def play_game(engines, opening, max_turns, movetime, depth):
+    position = opening.copy()
+    moves = []
+    for engine in engines.values():
+        engine.send("newgame")
+
+    while True:
+        if position.turns - position.capture >= max_turns:
+            return 'draw'
+        if position.outcome:
+            return position.outcome
+
+        move, _ = engines[position.turn].best_move(opening, moves, movetime, depth)
+        if move is None:
+            return 'draw'
+        if move not in position.valid_moves():
+            return 'black' if position.turn == WHITE else 'white'
+        moves.append(format_move(move))
+        position.make_move(move)
+        if position.turn == WHITE:
+            position.turns += 1
+
+"""
+Play a match through two warm engine processes, every opening once with each color
+
+Returns:
+    - scores: list | Per game score of engine A (1, 0.5 or 0)
+"""
+def run_match(spec_a, spec_b, games, max_turns, movetime, depth=None, seed=0, log=print):
+    engine_a, engine_b = EngineProcess(spec_a), EngineProcess(spec_b)
+    scores = []
+    try:
+        openings = generate_openings((games + 1) // 2, seed)
+        for game in range(games):
+            opening, a_is_white = openings[game // 2], game % 2 == 0
+            engines = {WHITE: engine_a, BLACK: engine_b} if a_is_white else {WHITE: engine_b, BLACK: engine_a}
+            outcome = play_game(engines, opening, max_turns, movetime, depth)
+            score = 0.5 if outcome == 'draw' else float((outcome == 'white') == a_is_white)
+            scores.append(score)
+            log(f'game {game + 1}: {opening.to_text()} A {"white" if a_is_white else "black"}, {outcome}')
+    finally:
+        engine_a.close()
+        engine_b.close()
+    return scores
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Play games between two Engine.py processes over the line protocol")
+    parser.add_argument("engine_a", type=str, help="Engine A options, e.g. heuristic=e2,tt_mb=64")
+    parser.add_argument("engine_b", type=str, help="Engine B options, e.g. heuristic=e0")
+    parser.add_argument("--games", type=int, default=20, help="Number of games, openings are played with colors swapped (default: 20)")
+    parser.add_argument("--max-turns", type=int, default=40, help="Turns without capture before a draw (default: 40)")
+    parser.add_argument("--movetime", type=int, default=500, help="Search time per move in milliseconds (default: 500)")
+    parser.add_argument("--depth", type=int, default=None, help="Deepest iteration per move (default: no limit)")
+    parser.add_argument("--seed", type=int, default=0, help="Opening sampling seed (default: 0)")
+    args = parser.parse_args()
+
+    start = time.time()
+    scores = run_match(args.engine_a, args.engine_b, args.games, args.max_turns, args.movetime, args.depth, args.seed)
+    elo, low, high = elo_difference(scores)
+    print(f'{len(scores)} games in {time.time() - start:.1f}s: '
+          f'+{scores.count(1.0)} ={scores.count(0.5)} -{scores.count(0.0)} for A')
+    print(f'Elo A - B: {elo:+.0f} (95% interval {low:+.0f} to {high:+.0f})')
@@ -0,0 +1,189 @@
+"""
+Long-running engine speaking a line protocol over stdin/stdout, in the spirit of UCI
+
+One process keeps its engine, transposition table, move orderer and evaluator
+warm across every move and game it is asked to play. Moves are written as
+from and to squares without a space, e.g. b2b3.
+
+    uci                                     identify, list options, answer uciok
+    isready                                 answer readyok
+    setoption name NAME value VALUE         engine option, as in Tournament specs (heuristic, tt_mb, ...)
+    newgame                                 back to the start position, tables stay warm
+    position startpos [moves M ...]         set the position, optionally followed by moves
+    position text BOARD SIDE [moves M ...]
+    go [depth N] [movetime MS] [infinite]   search in the background, answer "bestmove M"
+    stop                                    end the search early, it still answers bestmove
+    quit                                    stop and exit
+
+Before bestmove the engine writes "info depth D score S nodes N time MS pv M ...".
+"""
+import sys
+import math
+import time
+import argparse
+import threading
+from Minimax import MAX_DEPTH
+from Position import Position, WHITE, SIZE, encode_move, decode_move
+from Tournament import EngineConfig
+
+START_POSITION: str = "kqbn1/2pp1/5/1PP2/1NBQK w"
+
+def format_move(move):
+    (start_row, start_col), (end_row, end_col) = decode_move(move)
+    return f'{chr(start_col + ord("a"))}{5 - start_row}{chr(end_col + ord("a"))}{5 - end_row}'
+
+def parse_move(text):
+    if len(text) != 4 or not text[1].isdigit() or not text[3].isdigit():
+        raise ValueError(f"Malformed move {text}")
+    start = (5 - int(text[1]), ord(text[0].lower()) - ord('a'))
+    end = (5 - int(text[3]), ord(text[2].lower()) - ord('a'))
+    # encode_move packs 5 bits per square, an off-board square would wrap onto the board
+    if not all(0 <= index < SIZE for index in start + end):
+        raise ValueError(f"Move {text} leaves the board, files are a-e and ranks 1-5")
+    return encode_move(start, end)
+
+"""
+Protocol state: the position, the configured engine and the search thread
+
+Args:
+    - config: EngineConfig | Initial engine options
+    - out:    file | Where replies are written
+"""
+class EngineServer:
+    def __init__(self, config, out=sys.stdout):
+        self.config = config
+        self.out = out
+        self.lock = threading.Lock()
+        self.engine = config.build()
+        self.position = Position.from_text(START_POSITION)
+        self.thread = None
+
+    def send(self, line):
+        with self.lock:
+            self.out.write(line + "\n")
+            self.out.flush()
+
+    """
+    Handle one command line
+
+    Returns:
+        - running: bool | False once quit was received
+    """
+    def handle(self, line):
+        tokens = line.split()
+        if not tokens:
+            return True
+        command, args = tokens[0], tokens[1:]
+        if command == "quit":
+            self.stop()
+            return False
+        if command == "stop":
+            self.stop()
+        elif command == "isready":
+            self.send("readyok")
+        elif command == "uci":
+            self.send("id name Goldfish")
+            for name in EngineConfig.FIELDS:
+                self.send(f"option name {name}")
+            self.send("uciok")
+        else:
+            # Everything else changes what a search would use, wait for the current one
+            self.wait()
+            try:
+                if command in ("newgame", "ucinewgame"):
+                    self.position = Position.from_text(START_POSITION)
+                elif command == "position":
+                    self.set_position(args)
+                elif command == "setoption":
+                    self.set_option(args)
+                elif command == "go":
+                    self.go(args)
+                else:
+                    self.send(f"info string unknown command {command}")
+            except ValueError as error:
+                self.send(f"info string {error}")
+        return True
+
+    def set_position(self, args):
+        if "moves" in args:
+            index = args.index("moves")
+            args, moves = args[:index], args[index + 1:]
+        else:
+            moves = []
+        if args[:1] == ["startpos"]:
+            position = Position.from_text(START_POSITION)
+        elif args[:1] == ["text"]:
+            position = Position.from_text(" ".join(args[1:]))
+        else:
+            raise ValueError("position expects startpos or text")
+        for text in moves:
+            move = parse_move(text)
+            if position.outcome or move not in position.valid_moves():
+                raise ValueError(f"Illegal move {text}")
+            position.make_move(move)
+        self.position = position
+
+    # Rebuilds the engine, so the tables start cold again. A bad value keeps the current engine
+    def set_option(self, args):
+        if len(args) != 4 or args[0] != "name" or args[2] != "value":
+            raise ValueError("setoption expects name NAME value VALUE")
+        name, value = args[1], args[3]
+        if name not in EngineConfig.FIELDS:
+            raise ValueError(f"Unknown option {name}")
+        # Through the constructor, so the value is validated like a spec
+        config = EngineConfig(**{**vars(self.config), name: EngineConfig.FIELDS[name](value)})
+        self.engine = config.build()
+        self.config = config
+
+    def go(self, args):
+        args = [arg for arg in args if arg != "infinite"]
+        options = dict(zip(args[::2], args[1::2]))
+        depth = int(options.get("depth", MAX_DEPTH))
+        movetime = int(options["movetime"]) / 1000 if "movetime" in options else math.inf
+        engine = self.engine
+        engine.max_depth = depth
+        engine.time_limit = movetime
+        engine.stopped = False
+        engine.depth_reached = 0
+        self.thread = threading.Thread(target=self.search, args=(engine, self.position.copy()), daemon=True)
+        self.thread.start()
+
+    def search(self, engine, position):
+        start = time.time()
+        move = None if position.outcome else engine.find_move(position, None, position.turn == WHITE)
+        if move is None:
+            self.send("bestmove (none)")
+            return
+        pv = [text.replace(" ", "").lower() for text in engine.principal_variation()]
+        if pv[:1] != [format_move(move)]:
+            pv = [format_move(move)]
+        self.send(f"info depth {engine.depth_reached} score {engine.root_score} nodes {engine.total_nodes} "
+                  f"time {round((time.time() - start) * 1000)} pv {' '.join(pv)}")
+        self.send(f"bestmove {format_move(move)}")
+
+    def stop(self):
+        if self.thread is not None:
+            self.engine.stop()
+        self.wait()
+
+    def wait(self):
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+
+    """
+    Read commands until quit or end of input
+    """
+    def run(self, lines=sys.stdin):
+        for line in lines:
+            if not self.handle(line):
+                break
+        self.stop()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Engine server over stdin/stdout")
+    parser.add_argument("engine", type=EngineConfig.argument, nargs="?", default=EngineConfig(),
+                        help="Initial engine options, e.g. heuristic=e2,tt_mb=64")
+    args = parser.parse_args()
+
+    EngineServer(args.engine).run()
@@ -1,21 +1,93 @@
+import os
+import json
+from itertools import chain
+from Position import (Position, WHITE, BLACK, PIECE_VALUES, PAWN, KNIGHT, BISHOP, QUEEN, KING, SQUARES, SIZE, PROMOTION_ROW,
+                      SIGNED_VALUES, PIECE_SQUARE, KING_TARGETS, KNIGHT_TARGETS, BISHOP_RAYS, QUEEN_RAYS, QUEEN_BETWEEN,
+                      PAWN_PUSH, PAWN_CAPTURES)
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+HEURISTICS: list = ["e0", "e1", "e2", "e3", "e4"]
+
+MOBILITY_CACHE_SIZE: int = 1 << 16
+
+BATCH_SIZE: int = 4096 # Leaves collected before a batched evaluation
+
+# Largest change of the non-material terms of each heuristic in one move, used
+# by delta pruning in quiescence. None when the score is not driven by material.
+DELTA_MARGINS: dict = {"e0": 0, "e1": None, "e2": 3, "e3": 2, "e4": None}
+
+# e4 is a weighted sum of these terms, each from white's point of view. The king
+# keeps its fixed value so a captured king still ends the game in the score.
+WEIGHTS_FILE: str = os.path.join(os.path.dirname(os.path.abspath(__file__)), "weights.json")
+FEATURES: tuple = ("pawn", "knight", "bishop", "queen", "mobility", "positional")
+FEATURE_PIECES: tuple = (PAWN, KNIGHT, BISHOP, QUEEN)
+DEFAULT_WEIGHTS: dict = {"pawn": 1, "knight": 3, "bishop": 3, "queen": 9, "mobility": 0.3, "positional": 0} # e2
+
+"""
+Read e4 weights written by Tuning.py
+
+Args:
+    - path: string | JSON file with a "weights" object keyed by FEATURES, None for DEFAULT_WEIGHTS
+Returns:
+    - weights: list | One weight per feature, in FEATURES order
+"""
+def load_weights(path):
+    if path is None:
+        weights = DEFAULT_WEIGHTS
+    else:
+        try:
+            with open(path) as file:
+                weights = json.load(file)["weights"]
+        except FileNotFoundError:
+            raise ValueError(f"No weights file {path}, the e4 heuristic needs tuned weights: run Tuning.py --generate --tune first") from None
+    missing = [name for name in FEATURES if name not in weights]
+    if missing:
+        raise ValueError(f"{path} has no weight for {', '.join(missing)}")
+    return [weights[name] for name in FEATURES]
+
 class HeuristicsEvaluator:
-    def __init__(self, chess, heuristic):
+    def __init__(self, chess, heuristic, debug=False, weights=WEIGHTS_FILE):
         self.chess = chess
         self.heuristic = heuristic
-        self.score = 0
+        # Check every incremental score against a full recompute
+        self.debug = debug
+        # Mobility per Zobrist hash, cleared when full
+        self.mobility_cache = {}
+        self.mobility_probes = 0
+        self.mobility_hits = 0
+        self.delta_margin = DELTA_MARGINS.get(heuristic, 0)
+        # Only e4 reads the file, the path is kept for worker processes
+        self.weights_file = weights
+        if heuristic == "e4":
+            *piece_weights, self.mobility_weight, self.positional_weight = load_weights(weights)
+            # Signed value per piece code like SIGNED_VALUES, all floats so every sum is float math
+            self.weighted_values = [0.0] * 11
+            for piece, weight in zip(FEATURE_PIECES + (KING,), piece_weights + [PIECE_VALUES['K']]):
+                self.weighted_values[piece], self.weighted_values[-piece] = float(weight), -float(weight)
         heuristic_map : dict = {
             "e0": self.evaluate_e0,
             "e1": self.evaluate_e1,
-            "e2": self.evaluate_e2
+            "e2": self.evaluate_e2,
+            "e3": self.evaluate_e3,
+            "e4": self.evaluate_e4
         }
         self.evaluate = heuristic_map.get(heuristic, self.evaluate_e0)
 
     """
-    Evaluate the board at the end of each move, this is not efficient
-    but I added it in case we will need it in the future.
+    Material balance from white's point of view. A Position keeps it as a
+    running sum updated by make_move/unmake_move, so this is a field read.
     """
     def evaluate_e0(self, game_state):
-        piece_value = {'p': 1, 'B': 3, 'N': 3, 'Q': 9, 'K': 999}
+        if isinstance(game_state, Position):
+            if self.debug:
+                assert game_state.material == game_state.compute_material(), \
+                    f'Incremental material {game_state.material} != {game_state.compute_material()}'
+            return game_state.material
+
+        piece_value = PIECE_VALUES
         score = 0
         for row in game_state["board"]:
             for cell in row:
@@ -24,20 +96,216 @@ class HeuristicsEvaluator:
                     score += value if cell[0] == 'w' else -value
         return score
 
-    def update_e0(self, game_state, capt_piece):
-        piece_values = {'p': 1, 'B': 3, 'N': 3, 'Q': 9, 'K': 999}
-
-        self.score -= piece_values.get(capt_piece[1], 0) * (1 if capt_piece[0] == 'w' else -1)
-        return self.score
-
+    """
+    Mobility, white's move count minus black's. A Position counts moves
+    without materializing them and the result is cached by hash.
+    """
     def evaluate_e1(self, game_state):
+        if isinstance(game_state, Position):
+            self.mobility_probes += 1
+            mobility = self.mobility_cache.get(game_state.hash)
+            if mobility is not None:
+                self.mobility_hits += 1
+            else:
+                mobility = game_state.mobility()
+                if len(self.mobility_cache) >= MOBILITY_CACHE_SIZE:
+                    self.mobility_cache.clear()
+                self.mobility_cache[game_state.hash] = mobility
+            if self.debug:
+                assert mobility == len(game_state.valid_moves(WHITE)) - len(game_state.valid_moves(BLACK)), \
+                    f'Mobility {mobility} does not match the move lists'
+            return mobility
+
         white_moves = len(self.chess.valid_moves({**game_state, "turn": "white"}))
         black_moves = len(self.chess.valid_moves({**game_state, "turn": "black"}))
-        if self.chess.current_game_state["turn"] == "white":
-            return white_moves - black_moves
-        else:
-            return black_moves - white_moves
+        # Scored from white's point of view like e0, white is the maximizing player
+        return white_moves - black_moves
 
     def evaluate_e2(self, game_state):
         return 1 * self.evaluate_e0(game_state) + 0.3 * self.evaluate_e1(game_state)
 
+    """
+    Material plus piece-square tables, both running sums on the Position
+    """
+    def evaluate_e3(self, game_state):
+        if not isinstance(game_state, Position):
+            game_state = Position.from_state(game_state)
+        if self.debug:
+            assert game_state.positional == game_state.compute_positional(), \
+                f'Incremental positional {game_state.positional} != {game_state.compute_positional()}'
+        return self.evaluate_e0(game_state) + game_state.positional / 10
+
+    """
+    Tuned piece values, mobility and piece-square weights. Pieces are added
+    square by square, the order evaluate_batch uses, so both give the same floats.
+    """
+    def evaluate_e4(self, game_state):
+        if not isinstance(game_state, Position):
+            game_state = Position.from_state(game_state)
+        values = self.weighted_values
+        score = 0.0
+        for piece in game_state.board:
+            if piece:
+                score += values[piece]
+        if self.mobility_weight:
+            score += self.mobility_weight * self.evaluate_e1(game_state)
+        return score + self.positional_weight * game_state.positional
+
+    """
+    Evaluate many boards in one call with NumPy, scores are identical to evaluate
+
+    Without NumPy every board goes through evaluate one at a time.
+
+    Args:
+        - boards: list | Boards as flat lists of 25 piece codes, or an int8 array of shape (N, 25)
+    Returns:
+        - scores: list | One score per board, the same Python numbers evaluate returns
+    """
+    def evaluate_batch(self, boards):
+        if np is None:
+            return [self.evaluate(Position(list(board))) for board in boards]
+        boards = np.asarray(boards, dtype=np.int8).reshape(-1, SQUARES)
+        tables = _batch_tables()
+        if self.heuristic == "e1":
+            return _batch_mobility(boards, tables).tolist()
+        material = tables["values"][boards].sum(axis=1)
+        if self.heuristic == "e2":
+            return (1 * material + 0.3 * _batch_mobility(boards, tables)).tolist()
+        if self.heuristic == "e3":
+            positional = tables["piece_square"][boards, tables["squares"]].sum(axis=1)
+            return (material + positional / 10).tolist()
+        if self.heuristic == "e4":
+            values = np.array(self.weighted_values)
+            score = np.zeros(len(boards))
+            for sq in range(SQUARES):
+                score += values[boards[:, sq]]
+            if self.mobility_weight:
+                score += self.mobility_weight * _batch_mobility(boards, tables)
+            positional = tables["piece_square"][boards, tables["squares"]].sum(axis=1)
+            return (score + self.positional_weight * positional).tolist()
+        return material.tolist()
+
+    """
+    Evaluate the positions after each of a parent's moves, without building them one by one
+
+    The parents' boards are repeated once per move and the moves are played on
+    the copies as whole arrays, so a leaf costs its move and nothing else until
+    the batch is scored. Without NumPy every child goes through evaluate.
+
+    Args:
+        - parents:  array | Parent boards back to back as array('b'), 25 squares each
+        - moves:    list | One list of encoded moves per parent, none capturing a king
+    Returns:
+        - scores: list | One score per move in order, the same Python numbers evaluate returns
+    """
+    def evaluate_children(self, parents, moves):
+        if np is None:
+            scores = []
+            for index, parent_moves in enumerate(moves):
+                parent = parents[index * SQUARES:(index + 1) * SQUARES]
+                for move in parent_moves:
+                    board = list(parent)
+                    start, end = move >> 5, move & 31
+                    piece = board[start]
+                    if abs(piece) == PAWN and end // SIZE == PROMOTION_ROW[WHITE if piece > 0 else BLACK]:
+                        piece = QUEEN if piece > 0 else -QUEEN
+                    board[start], board[end] = 0, piece
+                    scores.append(self.evaluate(Position(board)))
+            return scores
+        counts = [len(parent_moves) for parent_moves in moves]
+        encoded = np.fromiter(chain.from_iterable(moves), dtype=np.int64, count=sum(counts))
+        boards = np.repeat(np.frombuffer(parents, dtype=np.int8).reshape(-1, SQUARES), counts, axis=0)
+        rows, start, end = np.arange(len(encoded)), encoded >> 5, encoded & 31
+        pieces = boards[rows, start]
+        promoted = ((pieces == PAWN) & (end // SIZE == PROMOTION_ROW[WHITE])) | \
+                   ((pieces == -PAWN) & (end // SIZE == PROMOTION_ROW[BLACK]))
+        boards[rows, start] = 0
+        boards[rows, end] = np.where(promoted, np.sign(pieces) * QUEEN, pieces)
+        return self.evaluate_batch(boards)
+
+"""
+Feature matrix of the e4 terms, what Tuning.py fits the weights on
+
+Args:
+    - boards: array | int8 boards of shape (N, 25)
+Returns:
+    - features: array | float64 of shape (N, len(FEATURES)), white's point of view
+"""
+def batch_features(boards):
+    tables = _batch_tables()
+    features = np.empty((len(boards), len(FEATURES)))
+    for index, piece in enumerate(FEATURE_PIECES):
+        features[:, index] = (boards == piece).sum(axis=1) - (boards == -piece).sum(axis=1)
+    features[:, -2] = _batch_mobility(boards, tables)
+    features[:, -1] = tables["piece_square"][boards, tables["squares"]].sum(axis=1)
+    return features
+
+_tables = None
+
+"""
+Move geometry for batched mobility, built on first use
+
+Targets are [from, to] 0/1 matrices ignoring blockers. between maps an
+occupancy vector to the number of pieces strictly between every (from, to)
+pair on a line. Matrices are float32 so products run through BLAS, the counts
+stay small exact integers.
+"""
+def _batch_tables():
+    global _tables
+    if _tables is None:
+        def targets(table):
+            array = np.zeros((SQUARES, SQUARES), dtype=np.float32)
+            for sq, squares in enumerate(table):
+                array[sq, list(squares)] = 1
+            return array
+
+        def rays(table):
+            return targets([[target for ray in sq_rays for target in ray] for sq_rays in table])
+
+        between = np.zeros((SQUARES * SQUARES, SQUARES), dtype=np.float32)
+        for pair, squares in enumerate(QUEEN_BETWEEN):
+            if squares:
+                between[pair, list(squares)] = 1
+
+        _tables = {
+            "values": np.array(SIGNED_VALUES, dtype=np.int64),
+            "piece_square": np.array(PIECE_SQUARE, dtype=np.int64),
+            "squares": np.arange(SQUARES),
+            KING: targets(KING_TARGETS),
+            KNIGHT: targets(KNIGHT_TARGETS),
+            BISHOP: rays(BISHOP_RAYS),
+            QUEEN: rays(QUEEN_RAYS),
+            "between": between.T.copy(),
+        }
+        for color in (WHITE, BLACK):
+            _tables["push", color] = targets([[target] if target >= 0 else [] for target in PAWN_PUSH[color]])
+            _tables["capture", color] = targets(PAWN_CAPTURES[color])
+    return _tables
+
+"""
+White's move count minus black's for every board, like Position.mobility
+"""
+def _batch_mobility(boards, tables):
+    count = len(boards)
+    empty = (boards == 0).astype(np.float32)
+    mobility = np.zeros(count, dtype=np.int64)
+    for color in (WHITE, BLACK):
+        pieces = boards * np.int8(color)
+        free = (pieces <= 0).astype(np.float32)
+        moves = ((pieces == KING) * (free @ tables[KING].T)
+                 + (pieces == KNIGHT) * (free @ tables[KNIGHT].T)
+                 + (pieces == PAWN) * (empty @ tables["push", color].T
+                                       + (pieces < 0).astype(np.float32) @ tables["capture", color].T)).sum(axis=1)
+        mobility += moves.astype(np.int64) if color == WHITE else -moves.astype(np.int64)
+
+    # Sliders are few, only their rows of the (board, from, to) tensor are built. A target
+    # is reachable when no square between is occupied and it holds no piece of the mover.
+    board_index, origin = np.nonzero((np.abs(boards) == BISHOP) | (np.abs(boards) == QUEEN))
+    if len(origin):
+        pieces = boards[board_index, origin].astype(np.int64)
+        colors = np.sign(pieces)
+        rays = np.where((np.abs(pieces) == BISHOP)[:, None], tables[BISHOP][origin], tables[QUEEN][origin])
+        blockers = ((1 - empty) @ tables["between"]).reshape(count, SQUARES, SQUARES)[board_index, origin]
+        moves = (rays * (blockers == 0) * (boards[board_index] * colors[:, None] <= 0)).sum(axis=1)
+        mobility += np.bincount(board_index, weights=moves * colors, minlength=count).astype(np.int64)
+    return mobility
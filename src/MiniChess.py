@@ -2,23 +2,70 @@ import math
 import copy
 import time
 import argparse
-from Heuristics import HeuristicsEvaluator
+from Heuristics import HeuristicsEvaluator, HEURISTICS, WEIGHTS_FILE, load_weights
 from Player import AI, Human
+from Position import Position, encode_move
+from Minimax import ENGINES, MAX_DEPTH, QUIESCENCE_NODES, ASPIRATION_WINDOW, NULL_MOVE_REDUCTION, LMR_MOVES, FUTILITY_MARGIN
+from Telemetry import COUNTERS
+from MoveOrdering import MAX_PLY
+from Tablebase import Tablebase, TABLEBASE_FILE
+from OpeningBook import OpeningBook, BOOK_FILE
 
 FILE:    int = 0b01
 CONSOLE: int = 0b10
 class MiniChess:
-    def __init__(self, time_limit, max_turns, use_alpha_beta, play_mode, heuristic):
+    def __init__(self, time_limit, max_turns, use_alpha_beta, play_mode, heuristic, engine="dfs", max_depth=MAX_DEPTH, tt_mb=16, debug_eval=False, move_ordering=True, workers=1, stats=None, quiescence_nodes=QUIESCENCE_NODES, tablebase=None, book=None, batch_eval=False, ponder=False, pvs=False, aspiration=ASPIRATION_WINDOW, null_move=0, lmr=0, futility=0, weights=WEIGHTS_FILE):
         self.current_game_state = self.init_board()
         self.output = []
-        self.evaluator = HeuristicsEvaluator(self, heuristic)
+        self.telemetry = [] # JSON lines of per-move search stats
+        self.evaluator = HeuristicsEvaluator(self, heuristic, debug_eval, weights)
         self.time_limit = time_limit
         self.max_turns = max_turns
         self.use_alpha_beta = use_alpha_beta
         self.play_mode = play_mode
+        self.engine = engine
+        self.max_depth = max_depth
+        self.tt_mb = tt_mb
+        self.move_ordering = move_ordering
+        self.workers = workers
+        self.stats = stats
+        self.quiescence_nodes = quiescence_nodes
+        self.batch_eval = batch_eval
+        self.pvs = pvs
+        self.aspiration = aspiration
+        self.null_move = null_move
+        self.lmr = lmr
+        self.futility = futility
+        # Opened once and shared by both AI players
+        self.tablebase = Tablebase(tablebase) if tablebase else None
+        self.book = OpeningBook(book) if book else None
         play_mode_arr = play_mode.split("-")
-        self.player1 = Human() if play_mode_arr[0] == "H" else AI(self.use_alpha_beta,self.time_limit, self.evaluator)
-        self.player2 = Human() if play_mode_arr[1] == "H" else AI(self.use_alpha_beta,self.time_limit, self.evaluator)
+        # Only a human opponent leaves the AI idle
+        self.ponder = ponder and "H" in play_mode_arr
+        # Both AI players get the same options, each builds its own table and orderer
+        ai_options = dict(
+            use_alpha_beta=self.use_alpha_beta,
+            time_limit=self.time_limit,
+            evaluator=self.evaluator,
+            engine=self.engine,
+            max_depth=self.max_depth,
+            tt_mb=self.tt_mb,
+            move_ordering=self.move_ordering,
+            workers=self.workers,
+            stats=self.stats,
+            quiescence_nodes=self.quiescence_nodes,
+            tablebase=self.tablebase,
+            book=self.book,
+            batch_eval=self.batch_eval,
+            ponder=self.ponder,
+            pvs=self.pvs,
+            aspiration=self.aspiration,
+            null_move=self.null_move,
+            lmr=self.lmr,
+            futility=self.futility,
+            )
+        self.player1 = Human() if play_mode_arr[0] == "H" else AI(**ai_options)
+        self.player2 = Human() if play_mode_arr[1] == "H" else AI(**ai_options)
 
     """
     Initialize the board
@@ -28,7 +75,8 @@ class MiniChess:
     Returns:
         - state: A dictionary representing the state of the game
     """
-    def init_board(self):
+    @staticmethod
+    def init_board():
         state = {
             "board": 
             [['bK', 'bQ', 'bB', 'bN', '.' ],
@@ -52,6 +100,8 @@ class MiniChess:
         - None
     """
     def display_board(self, game_state):
+        if isinstance(game_state, Position):
+            game_state = game_state.to_state()
         self.log()
         for i, row in enumerate(game_state["board"], start=1):
             self.log(str(6-i) + "  " + ' '.join(piece.rjust(3) for piece in row))
@@ -75,16 +125,22 @@ class MiniChess:
     Exit the game and write to console
     """
     def safe_exit(self):
+        for player in (self.player1, self.player2):
+            if isinstance(player, AI) and player.ponderer is not None:
+                player.stop_pondering()
         with open('output.txt', 'w') as out:
             out.write('\n'.join(self.output))
+        if self.telemetry:
+            with open('telemetry.jsonl', 'w') as out:
+                out.write('\n'.join(self.telemetry) + '\n')
         exit(0)
 
-    def on_board(self, x: int, y: int) -> bool:
-        return 0 <= x < len(self.current_game_state["board"][0]) and \
-               0 <= y < len(self.current_game_state["board"])
+    def on_board(self, game_state, x: int, y: int) -> bool:
+        return 0 <= x < len(game_state["board"][0]) and \
+               0 <= y < len(game_state["board"])
     
-    def empty(self, x: int, y: int) -> bool:
-        return self.current_game_state["board"][y][x] == '.'
+    def empty(self, game_state, x: int, y: int) -> bool:
+        return game_state["board"][y][x] == '.'
     """
     Check if the move is valid    
     
@@ -95,17 +151,25 @@ class MiniChess:
         - boolean representing the validity of the move
     """
     def is_valid_move(self, game_state, move):
-        return move in self.valid_moves(game_state)
+        (start_row, start_col), (end_row, end_col) = move
+        if not (self.on_board(game_state, start_col, start_row) and self.on_board(game_state, end_col, end_row)):
+            return False
+        # Checked against move tables, no move list is generated
+        return Position.from_state(game_state).is_legal(encode_move(*move))
 
     """
     Returns a list of valid moves
 
     Args:
-        - game_state:   dictionary | Dictionary representing the current game state
+        - game_state:   dictionary | Dictionary representing the current game state, or a compact Position
     Returns:
         - valid moves:   list | A list of nested tuples corresponding to valid moves [((start_row, start_col),(end_row, end_col)),((start_row, start_col),(end_row, end_col))]
+                                Encoded integer moves when given a Position
     """
     def valid_moves(self, game_state):
+        if isinstance(game_state, Position):
+            return game_state.valid_moves()
+
         move_validations: dict = {
             'p': self.valid_pawn_moves,
             'K': self.valid_king_moves,
@@ -148,13 +212,13 @@ class MiniChess:
         state = {"black": (1, 'w'), "white": (-1, 'b')}
         direction, opponent = state[game_state["turn"]]
         # Move forward
-        if self.on_board(i, j + direction) and self.empty(i, j + direction):
+        if self.on_board(game_state, i, j + direction) and self.empty(game_state, i, j + direction):
             moves.append(((j, i), (j + direction, i)))
         # Capture
         for diagonal in [-1, 1]:  
             x = i + diagonal
             y = j + direction
-            if self.on_board(x, y) and opponent in game_state["board"][y][x]:
+            if self.on_board(game_state, x, y) and opponent in game_state["board"][y][x]:
                 moves.append(((j, i), (y, x)))
                 
         return moves
@@ -175,7 +239,7 @@ class MiniChess:
         ]:
             x = i + x_dir
             y = j + y_dir
-            if self.on_board(x, y) and not game_state["board"][y][x].startswith(game_state["turn"][0]):
+            if self.on_board(game_state, x, y) and not game_state["board"][y][x].startswith(game_state["turn"][0]):
                 moves.append(((j, i), (y, x)))
         return moves
     """
@@ -196,7 +260,7 @@ class MiniChess:
         ]:
             x = i + x_dir
             y = j + y_dir
-            if self.on_board(x, y) and not game_state["board"][y][x].startswith(game_state["turn"][0]):
+            if self.on_board(game_state, x, y) and not game_state["board"][y][x].startswith(game_state["turn"][0]):
                 moves.append(((j, i), (y, x)))
         return moves
     """
@@ -211,8 +275,8 @@ class MiniChess:
         moves = self.valid_bishop_moves(game_state, j, i)
         for (x_dir, y_dir) in [(1, 0), (-1, 0), (0, 1), (0, -1)]: #Vertical and Horizontal
                 x, y = i, j
-                while self.on_board(x:=x+x_dir, y:=y+y_dir):
-                    if self.empty(x, y):
+                while self.on_board(game_state, x:=x+x_dir, y:=y+y_dir):
+                    if self.empty(game_state, x, y):
                         moves.append(((j, i), (y, x)))
                     elif not game_state["board"][y][x].startswith(game_state["turn"][0]):
                         moves.append(((j, i), (y, x)))
@@ -233,8 +297,8 @@ class MiniChess:
         moves = []
         for (x_dir, y_dir) in [(1, 1), (-1, -1), (1, -1), (-1, 1)]: # Diagonals / and \ 
             x, y = i, j
-            while self.on_board(x:=x+x_dir, y:=y+y_dir):
-                if self.empty(x, y):
+            while self.on_board(game_state, x:=x+x_dir, y:=y+y_dir):
+                if self.empty(game_state, x, y):
                     moves.append(((j, i), (y, x)))
                 elif not game_state["board"][y][x].startswith(game_state["turn"][0]):
                     moves.append(((j, i), (y, x)))
@@ -263,12 +327,15 @@ class MiniChess:
     Modify to board to make a move
 
     Args: 
-        - game_state:   dictionary | Dictionary representing the current game state
-        - move          tuple | the move to perform ((start_row, start_col),(end_row, end_col))
+        - game_state:   dictionary | Dictionary representing the current game state, or a compact Position
+        - move          tuple | the move to perform ((start_row, start_col),(end_row, end_col)), or an encoded move for a Position
     Returns:
-        - game_state:   dictionary | Dictionary representing the modified game state
+        - undo:         tuple | (captured piece, promoted, previous capture counter, previous outcome) for unmake_move
     """
     def make_move(self, game_state, move):
+        if isinstance(game_state, Position):
+            return game_state.make_move(move)
+
         start, end = move
 
         start_row, start_col = start
@@ -276,17 +343,18 @@ class MiniChess:
 
         moving_piece = game_state["board"][start_row][start_col]
         capt_piece = game_state["board"][end_row][end_col]
+        undo = (capt_piece, False, game_state["capture"], game_state["outcome"])
 
         # Turns since last capture
         ## Set to next turn because the current turn is not over yet
         if capt_piece != '.':
             game_state["capture"] = game_state["turns"] + 1
-            # self.evaluator.update_e0(game_state, capt_piece) # This function will evaluate the current board evaluation during each turn
 
         # Queening
         if (moving_piece == 'wp' and end_row == 0) or \
         (moving_piece == 'bp' and end_row == len(game_state["board"]) - 1):
             moving_piece = f'{game_state["turn"][0]}Q'
+            undo = (capt_piece, True, undo[2], undo[3])
 
         # King capture
         if capt_piece == 'wK' or capt_piece == 'bK':
@@ -296,7 +364,29 @@ class MiniChess:
         game_state["board"][end_row][end_col] = moving_piece
         game_state["turn"] = "black" if game_state["turn"] == "white" else "white"
 
-        return game_state
+        return undo
+
+    """
+    Restore the board as it was before make_move
+
+    Args: 
+        - game_state:   dictionary | Dictionary representing the current game state, or a compact Position
+        - move          tuple | the move that was performed
+        - undo          tuple | the token returned by make_move
+    Returns:
+        - None
+    """
+    def unmake_move(self, game_state, move, undo):
+        if isinstance(game_state, Position):
+            return game_state.unmake_move(move, undo)
+
+        (start_row, start_col), (end_row, end_col) = move
+        capt_piece, promoted, game_state["capture"], game_state["outcome"] = undo
+        game_state["turn"] = "black" if game_state["turn"] == "white" else "white"
+
+        moving_piece = game_state["board"][end_row][end_col]
+        game_state["board"][start_row][start_col] = f'{game_state["turn"][0]}p' if promoted else moving_piece
+        game_state["board"][end_row][end_col] = capt_piece
 
     """
     Parse the input string and modify it into board coordinates
@@ -377,6 +467,52 @@ def validate_positiveInt(value):
     if intValue <= 0:
         raise argparse.ArgumentTypeError(f"{value} must be a postive integer.")
     return intValue
+
+"""
+Validates that a value is an integer of 0 or more, for options where 0 turns a feature off
+
+Args:
+    - Value
+Returns:
+    - Value
+"""
+def validate_nonNegativeInt(value):
+    try:
+        intValue = int(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"Invalid input: {value} is not an integer.")
+    if intValue < 0:
+        raise argparse.ArgumentTypeError(f"{value} must be 0 or a positive integer.")
+    return intValue
+
+"""
+Validates --max-depth, plies 0 to max depth must fit the per-ply search tables
+
+Args:
+    - Value
+Returns:
+    - Value
+"""
+def validate_maxDepth(value):
+    intValue = validate_positiveInt(value)
+    if intValue >= MAX_PLY:
+        raise argparse.ArgumentTypeError(f"{value} must be below {MAX_PLY}, the per-ply search tables hold {MAX_PLY} plies.")
+    return intValue
+
+"""
+Parses the --stats counter list
+
+Args:
+    - Value, comma separated counter names or "all"
+Returns:
+    - List of counter names
+"""
+def validate_counters(value):
+    counters = COUNTERS if value == "all" else [name for name in value.split(",") if name]
+    unknown = [name for name in counters if name not in COUNTERS]
+    if unknown:
+        raise argparse.ArgumentTypeError(f"Unknown counter {', '.join(unknown)}, expected {', '.join(COUNTERS)} or all.")
+    return counters
     
 
 
@@ -387,8 +523,37 @@ if __name__ == "__main__":
     parser.add_argument("max_turns", type=validate_positiveInt, help="Maximum number of turns before game ends")
     parser.add_argument("use_alpha_beta", type=int, choices=[0,1], help="Use Alpha-Beta pruning? (0 = No, 1 = Yes).")
     parser.add_argument("play_mode", type=str, choices=["H-H","H-AI","AI-H","AI-AI"], help="Is Player 1 an AI? (H-H H-AI AI-H AI-AI.)")
-    parser.add_argument("heuristic", type=str, choices=["e0", "e1", "e2"], help="Which heuristic to use (e0, e1, e3)")
+    parser.add_argument("heuristic", type=str, choices=HEURISTICS, help=f"Which heuristic to use ({', '.join(HEURISTICS)})")
+    parser.add_argument("--weights", type=str, default=WEIGHTS_FILE, help="Weights file of the e4 heuristic written by Tuning.py --tune (default: weights.json next to MiniChess.py)")
+    parser.add_argument("--engine", type=str, choices=ENGINES, default="dfs", help="Search engine: full tree then minimax, or depth-first with lazy expansion (default: dfs)")
+    parser.add_argument("--tt-mb", type=validate_nonNegativeInt, default=16, help="Transposition table memory cap per AI player in MB, 0 disables it (default: 16)")
+    parser.add_argument("--workers", type=validate_positiveInt, default=1, help="Search processes per AI player, above 1 splits root moves across a process pool (default: 1)")
+    parser.add_argument("--no-ordering", action="store_true", help="Disable MVV-LVA, killer and history move ordering")
+    parser.add_argument("--debug-eval", action="store_true", help="Assert that incremental evaluation matches a full recompute at every leaf")
+    parser.add_argument("--max-depth", type=validate_maxDepth, default=MAX_DEPTH, help=f"Deepest iteration the AI may search within time_limit, below {MAX_PLY} (default: {MAX_DEPTH})")
+    parser.add_argument("--qs-nodes", type=validate_nonNegativeInt, default=QUIESCENCE_NODES, help=f"Quiescence nodes per search iteration, captures and queening moves are searched past the depth limit until it runs out, 0 disables quiescence (default: {QUIESCENCE_NODES})")
+    parser.add_argument("--tablebase", type=str, nargs="?", const=TABLEBASE_FILE, default=None, help="Probe the endgame tablebase file written by Tablebase.py --generate (default file: tablebase.bin next to MiniChess.py)")
+    parser.add_argument("--book", type=str, nargs="?", const=BOOK_FILE, default=None, help="Play from the opening book file written by OpeningBook.py (default file: book.bin next to MiniChess.py)")
+    parser.add_argument("--pvs", action="store_true", help="Principal variation search: null-window searches after the first move, with an aspiration window at the root (dfs engine with alpha-beta)")
+    parser.add_argument("--aspiration", type=float, default=ASPIRATION_WINDOW, help=f"With --pvs, half-width of the root window around the previous iteration's score, 0 searches the full window (default: {ASPIRATION_WINDOW})")
+    parser.add_argument("--null-move", type=int, nargs="?", const=NULL_MOVE_REDUCTION, default=0, help=f"Null-move pruning with reduction R plies, skipped when the side to move has only pawns and its king (dfs engine with alpha-beta, default R: {NULL_MOVE_REDUCTION})")
+    parser.add_argument("--lmr", type=int, nargs="?", const=LMR_MOVES, default=0, help=f"Late move reductions: quiet moves after the first N are searched a ply shallower, and again at full depth when they beat the bound (dfs engine with alpha-beta, default N: {LMR_MOVES})")
+    parser.add_argument("--futility", type=float, nargs="?", const=FUTILITY_MARGIN, default=0, help=f"Futility pruning: one ply from the horizon, skip quiet moves when material plus the margin cannot reach the window (dfs engine with alpha-beta, not e1 or e4, default margin: {FUTILITY_MARGIN})")
+    parser.add_argument("--batch-eval", action="store_true", help="Score leaves in NumPy batches instead of one at a time, needs --engine tree, one worker and --qs-nodes 0 with alpha-beta")
+    parser.add_argument("--ponder", action="store_true", help="H-AI and AI-H: keep searching on the human's time, the AI's move still gets time_limit")
+    parser.add_argument("--stats", type=validate_counters, default=None, help=f"Search counters to log per move and write to telemetry.jsonl, comma separated or all ({', '.join(COUNTERS)})")
     args = parser.parse_args()
+    if args.heuristic == "e4":
+        try:
+            load_weights(args.weights)
+        except ValueError as error:
+            parser.error(str(error))
+    # Only the single process tree engine batches, anything else would ignore the flag
+    if args.batch_eval and (args.engine != "tree" or args.workers > 1):
+        parser.error("--batch-eval only applies to --engine tree with one worker")
+    # Without alpha-beta quiescence is already off
+    if args.batch_eval and args.qs_nodes and args.use_alpha_beta:
+        parser.error("--batch-eval scores leaves statically and cannot be combined with quiescence, add --qs-nodes 0")
     
     game = MiniChess( 
         time_limit=args.time_limit,
@@ -396,5 +561,23 @@ if __name__ == "__main__":
         use_alpha_beta=bool(args.use_alpha_beta),
         play_mode=args.play_mode,
         heuristic=args.heuristic,
+        engine=args.engine,
+        max_depth=args.max_depth,
+        tt_mb=args.tt_mb,
+        debug_eval=args.debug_eval,
+        move_ordering=not args.no_ordering,
+        workers=args.workers,
+        stats=args.stats,
+        quiescence_nodes=args.qs_nodes,
+        tablebase=args.tablebase,
+        book=args.book,
+        batch_eval=args.batch_eval,
+        ponder=args.ponder,
+        pvs=args.pvs,
+        aspiration=args.aspiration,
+        null_move=args.null_move,
+        lmr=args.lmr,
+        futility=args.futility,
+        weights=args.weights,
         )
     game.play()
\ No newline at end of file
@@ -1,14 +1,81 @@
 import math
 import time
-import copy
-from Heuristics import HeuristicsEvaluator
+from array import array
+from Heuristics import HeuristicsEvaluator, BATCH_SIZE
+from Position import Position, decode_move, PAWN, QUEEN, KING, SIZE, PROMOTION_ROW, SIGNED_VALUES
+from TranspositionTable import EXACT, LOWER, UPPER
+
+ENGINES: list = ["tree", "dfs"]
+
+MAX_DEPTH:   int = 30
+TIME_MARGIN: float = 0.9 # Share of time_limit the search may use, the rest covers overhead
+QUIESCENCE_NODES: int = 50000 # Quiescence nodes allowed per iteration, 0 disables quiescence
+PROMOTION_GAIN: int = SIGNED_VALUES[QUEEN] - SIGNED_VALUES[PAWN]
+ASPIRATION_WINDOW: float = 0.5 # Root window half-width around the previous iteration's score, 0 searches the full window
+NULL_WINDOW: float = 1e-6 # Width of the PVS scout window, any positive width gives the same results
+
+# Selective search defaults, each is off unless asked for
+NULL_MOVE_REDUCTION: int = 2 # Plies a null move search is shallower than the move it stands in for
+LMR_MOVES: int = 3           # Moves searched at full depth before quiet moves are reduced
+LMR_REDUCTION: int = 1       # Plies late quiet moves are reduced by
+FUTILITY_MARGIN: float = 3.0 # Material a quiet move at the frontier is assumed unable to win
+
+# Raised inside the search when the deadline passes, the iteration in progress is discarded
+class SearchTimeout(Exception):
+    pass
 
 class Minimax:
-    def __init__(self, game, evaluator, use_alpha_beta=True, time_limit=5):
+    def __init__(self, game, evaluator, use_alpha_beta=True, time_limit=5, engine="dfs", max_depth=MAX_DEPTH, tt=None, orderer=None, stats=None,
+                 quiescence_nodes=QUIESCENCE_NODES, tablebase=None, batch_eval=False, pvs=False, aspiration=ASPIRATION_WINDOW,
+                 null_move=0, lmr=0, futility=0):
         self.game = game
         self.evaluator = evaluator
         self.use_alpha_beta = use_alpha_beta
         self.time_limit = time_limit
+        self.engine = engine
+        self.max_depth = max_depth
+        # Transposition table owned by the caller so it can outlive this search, dfs engine only
+        self.tt = tt
+        # MoveOrderer owned by the caller so the history table persists across turns
+        self.orderer = orderer
+        # Optional SearchStats, None keeps the search free of instrumentation
+        self.stats = stats
+        self.generate_moves, self.evaluate = Position.valid_moves, evaluator.evaluate
+        # Move generation stages, captures and promotions then quiet moves
+        self.generate_noisy, self.generate_quiet = Position.noisy_moves, Position.quiet_moves
+        if stats is not None:
+            self.generate_moves, self.evaluate, self.generate_noisy, self.generate_quiet = \
+                stats.instrument(self.generate_moves, self.evaluate, self.generate_noisy, self.generate_quiet)
+        # Without alpha-beta nothing bounds quiescence, the first iteration would spend
+        # the whole budget there and stop iterative deepening, so plain minimax skips it
+        self.quiescence_nodes = quiescence_nodes if use_alpha_beta else 0
+        # Endgame Tablebase shared by the caller, positions it covers are not searched
+        self.tablebase = tablebase
+        # Tree engine only, statically scored leaves are evaluated in batches
+        if batch_eval and self.quiescence_nodes:
+            raise ValueError("Batched evaluation scores leaves statically, set quiescence_nodes to 0")
+        self.batch_eval = batch_eval
+        # Principal variation search with aspiration windows, dfs engine with alpha-beta only
+        self.pvs = pvs and use_alpha_beta
+        self.aspiration = aspiration
+        # Selective search, dfs engine with alpha-beta only, 0 disables each
+        self.null_move = null_move if use_alpha_beta else 0 # reduction R in plies
+        self.lmr = lmr if use_alpha_beta else 0 # full-depth moves before reducing
+        # Material margin, plus the evaluator's allowance for everything else. Heuristics
+        # without a material term have no allowance and are never pruned
+        self.futility = futility + evaluator.delta_margin \
+            if futility and use_alpha_beta and evaluator.delta_margin is not None else 0
+        self.nodes = 0
+        self.qnodes = 0 # quiescence nodes of the current iteration
+        self.root_score = None
+        self.root_position = None
+        self.depth_reached = 0
+        self.root_depth = 0
+        self.total_nodes = 0 # nodes over every iteration of the last search
+        self.deadline = math.inf
+        self.tt_cutoff = False # set when a table entry ended a line early in the current iteration
+        self.stopped = False # set from another thread by stop
+        self.tree_pv = [] # encoded best line of the last tree search
 
     """
     Converts the move coordinates into letter number form (Ex: B3, B4)
@@ -31,80 +98,624 @@ class Minimax:
 
     def generate_game_tree(self, game_state, depth, is_maximizing):
         root_node = MinimaxTreeNode(game_state, self.evaluator, maxDepth=depth, depth=0, is_maximizing=is_maximizing)
+        self.nodes = 1
+        self.qnodes = 0
+        # Leaves are resolved by quiescence with a full window, the tree has no bounds yet
+        leaf_score = (lambda position, maximizing: self.quiescence(position, -math.inf, math.inf, maximizing)) \
+            if self.quiescence_nodes else None
+        # Leaves waiting on a batched evaluation
+        pending = LeafBatch() if self.batch_eval and leaf_score is None else None
         nodes_to_explore = [root_node]
         
         while nodes_to_explore:
             #Case where time is exceeded
-            if time.time() - self.start_time > self.time_limit:
-                return None
+            if time.time() > self.deadline:
+                raise SearchTimeout()
             current_node = nodes_to_explore.pop()
             
-            if current_node.depth < depth:
-                current_node.generate_children(self.game) 
-                # Sorting for optimal pruning
-                if self.use_alpha_beta:
-                    current_node.children.sort(
-                    key=lambda x: (x.score if x.score is not None else -math.inf) if current_node.is_maximizing else (x.score if x.score is not None else math.inf),
-                    reverse=current_node.is_maximizing
-                     )
+            # Leaves were evaluated on creation and keep no state
+            if current_node.depth < depth and current_node.game_state is not None:
+                current_node.generate_children(self.game, self.orderer, leaf_score, pending, self.evaluate)
+                self.nodes += len(current_node.children)
+                if pending and pending.parents[-1] is current_node:
+                    # Sorted once the scores are in
+                    if len(pending) >= BATCH_SIZE:
+                        self.evaluate_pending(pending)
+                elif self.use_alpha_beta:
+                    self.sort_children(current_node)
                     
                 nodes_to_explore.extend(current_node.children)  
 
+        if pending:
+            self.evaluate_pending(pending)
         return root_node
 
-    # Returns the best move
+    # Sorting for optimal pruning
+    def sort_children(self, node):
+        node.children.sort(
+            key=lambda x: (x.score if x.score is not None else -math.inf) if node.is_maximizing else (x.score if x.score is not None else math.inf),
+            reverse=node.is_maximizing
+        )
+
+    """
+    Score the pending leaves in one batch, then sort their parents' children
+
+    Args:
+        - pending: LeafBatch | Leaves to score, cleared
+    """
+    def evaluate_pending(self, pending):
+        scores = iter(self.evaluator.evaluate_children(pending.boards, pending.moves))
+        for parent, leaves in zip(pending.parents, pending.leaves):
+            for leaf in leaves:
+                leaf.score = next(scores)
+            if self.use_alpha_beta:
+                self.sort_children(parent)
+        pending.clear()
+
+    """
+    Returns the best move
+
+    Args:
+        - game_state:           dictionary | Dictionary representing the current game state
+        - depth:                int | Search depth in plies, None to deepen iteratively within time_limit
+        - maximizing_player:    bool | True when the side to move maximizes the evaluation (white)
+    Returns:
+        - best_move:            string | The move in letter number form (Ex: B3 B4), None if no move was found
+    """
     def getMove(self, game_state, depth, maximizing_player):
+        # Search on the compact representation, the dictionary state stays untouched
+        best_move = self.find_move(Position.from_state(game_state), depth, maximizing_player)
+
+        if best_move is not None:
+            best_move = self.convert_to_notation(*decode_move(best_move))
+            print(f'{self.game.current_game_state["turn"].capitalize()} to move: {best_move}')
+            if self.orderer is not None:
+                print(f'Move ordering: {self.orderer.report()}')
+
+        return best_move
+
+    """
+    Returns the best encoded move without any output, for headless callers
+
+    Args:
+        - position:             Position | The position to search, left untouched
+        - depth:                int | Search depth in plies, None to deepen iteratively within time_limit
+        - maximizing_player:    bool | True when the side to move maximizes the evaluation (white)
+    Returns:
+        - best_move:            int | The best encoded move, None if there is no legal move
+    """
+    def find_move(self, position, depth, maximizing_player):
         self.start_time = time.time()
+        self.root_score = None
+        self.total_nodes = 0
+        self.root_position = position.copy()
+        if self.tt is not None:
+            self.tt.new_search()
+        if self.orderer is not None:
+            self.orderer.new_search()
+        if self.stats is not None:
+            self.stats.reset(self)
+
+        # A covered position is solved, play the table move at once
+        if self.tablebase is not None:
+            result = self.tablebase.best_move(position)
+            if result is not None:
+                best_move, value = result
+                self.root_score = self.tablebase.score(value, position.turn)
+                self.depth_reached = self.nodes = 0
+                return best_move
+
+        if depth is None:
+            return self.iterative_deepening(position, maximizing_player)
+
+        self.deadline = math.inf
+        best_move = self.search(position.copy(), depth, maximizing_player)
+        self.depth_reached = depth
+        self.total_nodes = self.nodes
+        if self.stats is not None:
+            self.stats.iteration_nodes.append(self.nodes)
+        return best_move
+
+    """
+    Principal variation of the last search, following best moves stored in the
+    transposition table from the root, empty when the search has no table. The
+    tree engine keeps the line of best children of its last iteration instead.
+
+    Returns:
+        - pv: list | Moves in letter number form
+    """
+    def principal_variation(self):
+        if self.engine == "tree":
+            return [self.convert_to_notation(*decode_move(move)) for move in self.tree_pv]
+        position = self.root_position.copy()
+        pv, seen = [], set()
+        while len(pv) < max(self.depth_reached, 1) and position.hash not in seen and not position.outcome:
+            seen.add(position.hash)
+            move = self.tt.best_move(position.hash) if self.tt is not None else None
+            if not move or move not in position.valid_moves():
+                break
+            pv.append(self.convert_to_notation(*decode_move(move)))
+            position.make_move(move)
+        return pv
+
+    """
+    Ask a running iterative deepening search, in another thread, to return its
+    best move so far. Depth 1 still completes so there is always a move. The
+    caller clears stopped and depth_reached before starting the next search.
+    """
+    def stop(self):
+        self.stopped = True
+        if self.depth_reached:
+            self.deadline = -math.inf
+
+    def search(self, position, depth, maximizing_player, first_move=None):
+        if self.engine == "tree":
+            return self.search_tree(position, depth, maximizing_player)
+        return self.search_dfs(position, depth, maximizing_player, first_move)
+
+    """
+    Search depth 1, 2, 3, ... and keep the move of the last completed iteration.
+    The next iteration only starts if its predicted cost, the last iteration's
+    time times its effective branching factor, fits in the remaining budget.
 
-        root_node = self.generate_game_tree(game_state, depth, maximizing_player)
-        alpha = -math.inf
-        beta = math.inf
+    Args:
+        - position:             Position | The position to search, left untouched
+        - maximizing_player:    bool | True when the side to move maximizes the evaluation (white)
+    Returns:
+        - move: int | The best encoded move, None if there is no legal move
+    """
+    def iterative_deepening(self, position, maximizing_player):
+        budget = self.time_limit * TIME_MARGIN
+        # Depth 1 always completes so there is a legal move to play
+        self.deadline = math.inf
+        self.depth_reached = 0
         best_move = None
+        last_nodes = 0
 
-        best_move = self.minimax(root_node, depth, alpha, beta, maximizing_player,self.use_alpha_beta)
+        for depth in range(1, self.max_depth + 1):
+            iteration_start = time.time()
+            try:
+                # A timeout leaves the searched position mid-line, so search a copy
+                move = self.search(position.copy(), depth, maximizing_player, best_move)
+            except SearchTimeout:
+                self.total_nodes += self.nodes
+                break
+            self.total_nodes += self.nodes
+            if self.stats is not None:
+                self.stats.iteration_nodes.append(self.nodes)
+            if move is None:
+                break
+            best_move, self.depth_reached = move, depth
 
-        if best_move:
-            best_move = self.convert_to_notation(best_move.move[0], best_move.move[1])
-            print(f'{self.game.current_game_state["turn"].capitalize()} to move: {best_move}')
+            # Every line ended before this depth, searching deeper sees nothing new. Table
+            # cutoffs also repeat node counts, after pondering or a previous turn. Quiescence
+            # nodes are capped per iteration and do not grow with depth, so they are left out
+            nodes = self.nodes - self.qnodes
+            if nodes == last_nodes and not self.tt_cutoff:
+                break
+            branching = nodes / last_nodes if last_nodes else nodes
+            last_nodes = nodes
+            now = time.time()
+            if now - self.start_time + (now - iteration_start) * branching > budget:
+                break
+            self.deadline = self.start_time + budget
+            if self.stopped:
+                break
 
         return best_move
-            
-    def minimax(self, node, depth, alpha, beta, maximizingPlayer, use_alpha_beta):
-        if time.time() - self.start_time > self.time_limit:
-            return node
 
+    """
+    Build the full game tree to the given depth, then run minimax over it
+
+    Returns:
+        - move: int | The best encoded move at the root, None if there is none
+    """
+    def search_tree(self, position, depth, maximizing_player):
+        root_node = self.generate_game_tree(position, depth, maximizing_player)
+        self.root_score = self.minimax(root_node, depth, -math.inf, math.inf, maximizing_player, self.use_alpha_beta)
+        # The tree has no transposition table, its PV is the chain of best children
+        self.tree_pv = []
+        node = root_node.best_child
+        while node is not None:
+            self.tree_pv.append(node.move)
+            node = node.best_child
+        return root_node.best_child.move if root_node.best_child else None
+
+    def minimax(self, node, depth, alpha, beta, maximizingPlayer, use_alpha_beta):
+        stats = self.stats
+        if stats is not None and stats.count_nodes:
+            stats.visited[node.depth] += 1
         # Base case
         if depth == 0 or not node.children:
-            return node 
+            if stats is not None and stats.count_nodes:
+                stats.evaluated[node.depth] += 1
+            if node.score is None:
+                node.score = self.evaluate(node.game_state)
+            return node.score
+
+        if time.time() > self.deadline:
+            raise SearchTimeout()
 
         best_node = None 
 
         if maximizingPlayer:
             v = -math.inf  
-            for child in node.children:
-                child_node = self.minimax(child, depth - 1, alpha, beta, False, use_alpha_beta)
-                score = child_node.score
-                if score > v: 
+            for index, child in enumerate(node.children):
+                score = self.minimax(child, depth - 1, alpha, beta, False, use_alpha_beta)
+                if best_node is None or score > v: 
                     v = score
-                    best_node = child_node
+                    best_node = child
                 alpha = max(alpha, v) 
                 if use_alpha_beta and beta <= alpha: 
+                    if self.orderer is not None:
+                        self.orderer.record_cutoff(node.game_state, child.move, depth, node.depth, index)
+                    if stats is not None:
+                        stats.cutoffs += 1
                     break  
-            return best_node
 
         else:
             v = math.inf  
-            for child in node.children:
-                child_node = self.minimax(child, depth - 1, alpha, beta, True, use_alpha_beta)
-                score = child_node.score
-                if score < v:
+            for index, child in enumerate(node.children):
+                score = self.minimax(child, depth - 1, alpha, beta, True, use_alpha_beta)
+                if best_node is None or score < v:
                     v = score
-                    best_node = child_node
+                    best_node = child
                 beta = min(beta, v)  
                 if use_alpha_beta and beta <= alpha:
+                    if self.orderer is not None:
+                        self.orderer.record_cutoff(node.game_state, child.move, depth, node.depth, index)
+                    if stats is not None:
+                        stats.cutoffs += 1
                     break
-            return best_node
+
+        node.best_child = best_node
+        return v
+
+    """
+    Depth-first search that only generates and evaluates the nodes it visits,
+    so subtrees cut off by alpha-beta are never expanded
+
+    Args:
+        - first_move:   int | Move searched first, usually the best move of the previous iteration
+    Returns:
+        - move: int | The best encoded move at the root, None if there is none
+    """
+    def search_dfs(self, position, depth, maximizing_player, first_move=None):
+        self.nodes = 1
+        self.tt_cutoff = False
+        self.qnodes = 0
+        self.root_depth = depth
+        if self.stats is not None and self.stats.count_nodes:
+            self.stats.visited[0] += 1
+        moves = self.order_moves(position, position.valid_moves(), 0, first_move or self.tt_move(position))
+
+        # Aspiration window around the previous iteration's score, widened and searched
+        # again whenever the score falls outside it. Re-searches are only cheap when
+        # the transposition table remembers the first attempt
+        window = self.aspiration
+        if self.pvs and window and self.tt is not None and self.root_score is not None:
+            alpha, beta = self.root_score - window, self.root_score + window
+        else:
+            alpha, beta = -math.inf, math.inf
+        while True:
+            best_move, v = self.search_root(position, depth, maximizing_player, moves, alpha, beta)
+            if best_move is None or alpha < v < beta:
+                break
+            window *= 2
+            if v <= alpha:
+                alpha = v - window
+            else:
+                beta = v + window
+
+        if self.tt is not None and best_move is not None:
+            self.tt.store(position.hash, depth, v, EXACT, best_move)
+        self.root_score = v
+        return best_move
+
+    """
+    Search the root moves within a window
+
+    Returns:
+        - (best_move, v): tuple | v is exact only when it falls strictly inside the window
+    """
+    def search_root(self, position, depth, maximizing_player, moves, alpha, beta):
+        best_move, v = None, -math.inf if maximizing_player else math.inf
+        for index, move in enumerate(moves):
+            undo = position.make_move(move)
+            score = self.scout(position, depth - 1, alpha, beta, not maximizing_player) if self.pvs and index else \
+                self.alphabeta(position, depth - 1, alpha, beta, not maximizing_player)
+            position.unmake_move(move, undo)
+            if maximizing_player:
+                if best_move is None or score > v:
+                    v, best_move = score, move
+                alpha = max(alpha, v)
+            else:
+                if best_move is None or score < v:
+                    v, best_move = score, move
+                beta = min(beta, v)
+            # Only an aspiration window can fail at the root
+            if beta <= alpha:
+                break
+        return best_move, v
+
+    """
+    PVS search of a child after the first move: a null window next to the bound
+    the move has to beat, and the full window again only when it does beat it
+
+    Args:
+        - maximizing:   bool | Side to move in the child
+    """
+    def scout(self, position, depth, alpha, beta, maximizing):
+        if maximizing:
+            score = self.alphabeta(position, depth, beta - NULL_WINDOW, beta, maximizing)
+        else:
+            score = self.alphabeta(position, depth, alpha, alpha + NULL_WINDOW, maximizing)
+        if alpha < score < beta:
+            score = self.alphabeta(position, depth, alpha, beta, maximizing)
+        return score
+
+    """
+    Late move reduction: a null-window search LMR_REDUCTION plies shallower, and
+    the move's normal search only when that beats the bound
+
+    Args:
+        - depth:        int | Depth the move would normally get
+        - maximizing:   bool | Side to move in the child
+    """
+    def reduced(self, position, depth, alpha, beta, maximizing):
+        if maximizing:
+            score = self.alphabeta(position, depth - LMR_REDUCTION, beta - NULL_WINDOW, beta, maximizing)
+            if score >= beta:
+                return score
+        else:
+            score = self.alphabeta(position, depth - LMR_REDUCTION, alpha, alpha + NULL_WINDOW, maximizing)
+            if score <= alpha:
+                return score
+        return self.scout(position, depth, alpha, beta, maximizing) if self.pvs else \
+            self.alphabeta(position, depth, alpha, beta, maximizing)
+
+    def tt_move(self, position):
+        if self.tt is None:
+            return None
+        entry = self.tt.probe(position.hash)
+        return entry[3] if entry else None
+
+    # Order with the MoveOrderer, otherwise just search the hash move first when it is legal here
+    def order_moves(self, position, moves, ply, first_move):
+        if self.orderer is not None:
+            return self.orderer.order(position, moves, ply, first_move)
+        if first_move and first_move in moves:
+            moves.remove(first_move)
+            moves.insert(0, first_move)
+        return moves
+
+    """
+    Moves in the MoveOrderer's order, generated one stage at a time
+
+    The hash move is tried before anything is generated, then captures and
+    promotions, and quiet moves are only generated when no earlier move cut off.
+    The order is the same as sorting the full move list. quiet=False stops after
+    captures and promotions.
+
+    Returns:
+        - moves: generator | Encoded moves
+    """
+    def staged_moves(self, position, ply, hash_move, quiet=True):
+        if hash_move and position.is_legal(hash_move) and (quiet or position.is_noisy(hash_move)):
+            yield hash_move
+        else:
+            hash_move = None
+        for generate in (self.generate_noisy, self.generate_quiet) if quiet else (self.generate_noisy,):
+            moves = generate(position)
+            if hash_move in moves:
+                moves.remove(hash_move)
+            yield from self.orderer.order(position, moves, ply)
+
+    def alphabeta(self, position, depth, alpha, beta, maximizingPlayer, allow_null=True):
+        self.nodes += 1
+        ply = self.root_depth - depth
+        stats = self.stats
+        if stats is not None and stats.count_nodes:
+            stats.visited[ply] += 1
+        if self.tablebase is not None:
+            value = self.tablebase.probe(position)
+            if value is not None:
+                return self.tablebase.score(value, position.turn)
+        # Base case, a captured king ends the game
+        if depth == 0 or position.outcome:
+            if stats is not None and stats.count_nodes:
+                stats.evaluated[ply] += 1
+            if not position.outcome and self.qnodes < self.quiescence_nodes:
+                return self.quiescence(position, alpha, beta, maximizingPlayer)
+            return self.evaluate(position)
+
+        # Reading the clock on every node is measurable, check every 256 nodes
+        if not self.nodes & 255 and time.time() > self.deadline:
+            raise SearchTimeout()
+
+        # Transposition table, scores are white's point of view like the evaluation
+        tt_move = None
+        if self.tt is not None:
+            entry = self.tt.probe(position.hash)
+            if entry:
+                tt_depth, tt_score, tt_flag, tt_move = entry
+                if tt_depth >= depth and (tt_flag == EXACT or
+                                          (tt_flag == LOWER and tt_score >= beta) or
+                                          (tt_flag == UPPER and tt_score <= alpha)):
+                    self.tt_cutoff = True
+                    return tt_score
+
+        # Null move: if passing still fails high, a real move would too. Not twice in
+        # a row, and not with only pawns and the king, where passing can be the best move
+        reduction = self.null_move
+        if reduction and allow_null and depth > reduction and position.has_pieces(position.turn):
+            if maximizingPlayer and beta < math.inf and position.material >= beta:
+                position.make_null_move()
+                score = self.alphabeta(position, depth - 1 - reduction, beta - NULL_WINDOW, beta, False, False)
+                position.make_null_move()
+                if score >= beta:
+                    return score
+            elif not maximizingPlayer and alpha > -math.inf and position.material <= alpha:
+                position.make_null_move()
+                score = self.alphabeta(position, depth - 1 - reduction, alpha, alpha + NULL_WINDOW, True, False)
+                position.make_null_move()
+                if score <= alpha:
+                    return score
+
+        # Futility: one ply from the horizon, a quiet move cannot bring the material
+        # back to the window, so only captures and promotions are searched
+        quiet = not (self.futility and depth == 1 and
+                     (position.material + self.futility <= alpha if maximizingPlayer else
+                      position.material - self.futility >= beta))
+
+        if self.orderer is not None:
+            moves = self.staged_moves(position, ply, tt_move, quiet)
+        else:
+            moves = self.generate_moves(position) if quiet else self.generate_noisy(position)
+            if not moves:
+                return self.evaluate(position)
+            moves = self.order_moves(position, moves, ply, tt_move)
+
+        alpha_start, beta_start = alpha, beta
+        best_move = 0
+        if maximizingPlayer:
+            v = -math.inf
+            for index, move in enumerate(moves):
+                undo = position.make_move(move)
+                # Late quiet moves (no capture, no promotion) are searched shallower first
+                if self.lmr and index >= self.lmr and depth > LMR_REDUCTION + 1 and not undo[0] and not undo[1]:
+                    score = self.reduced(position, depth - 1, alpha, beta, False)
+                else:
+                    score = self.scout(position, depth - 1, alpha, beta, False) if self.pvs and index else \
+                        self.alphabeta(position, depth - 1, alpha, beta, False)
+                position.unmake_move(move, undo)
+                if score > v:
+                    v, best_move = score, move
+                alpha = max(alpha, v)
+                if self.use_alpha_beta and beta <= alpha:
+                    if self.orderer is not None:
+                        self.orderer.record_cutoff(position, move, depth, ply, index)
+                    if stats is not None:
+                        stats.cutoffs += 1
+                    break
+        else:
+            v = math.inf
+            for index, move in enumerate(moves):
+                undo = position.make_move(move)
+                # Late quiet moves (no capture, no promotion) are searched shallower first
+                if self.lmr and index >= self.lmr and depth > LMR_REDUCTION + 1 and not undo[0] and not undo[1]:
+                    score = self.reduced(position, depth - 1, alpha, beta, True)
+                else:
+                    score = self.scout(position, depth - 1, alpha, beta, True) if self.pvs and index else \
+                        self.alphabeta(position, depth - 1, alpha, beta, True)
+                position.unmake_move(move, undo)
+                if score < v:
+                    v, best_move = score, move
+                beta = min(beta, v)
+                if self.use_alpha_beta and beta <= alpha:
+                    if self.orderer is not None:
+                        self.orderer.record_cutoff(position, move, depth, ply, index)
+                    if stats is not None:
+                        stats.cutoffs += 1
+                    break
+
+        # The staged generator only finds out there are no moves by running dry
+        if not best_move:
+            return self.evaluate(position)
+        if self.tt is not None:
+            flag = UPPER if v <= alpha_start else LOWER if v >= beta_start else EXACT
+            self.tt.store(position.hash, depth, v, flag, best_move)
+        return v
+
+    """
+    Quiescence search, extends captures and pawn queening moves past the depth
+    limit so the evaluation is only trusted in quiet positions
+
+    The side to move may stand pat on the static score instead of capturing.
+    With alpha-beta a stand pat beyond the window cuts off at once and delta
+    pruning skips captures that cannot bring the score back to the window even
+    with the evaluator's margin for non-material terms. Child nodes count
+    against quiescence_nodes per iteration, past it leaves keep their static score.
+
+    Returns:
+        - score: float | White's point of view like evaluate
+    """
+    def quiescence(self, position, alpha, beta, maximizingPlayer):
+        v = self.evaluate(position)
+        if position.outcome:
+            return v
+        if self.use_alpha_beta:
+            if maximizingPlayer:
+                if v >= beta:
+                    return v
+                alpha = max(alpha, v)
+            else:
+                if v <= alpha:
+                    return v
+                beta = min(beta, v)
+
+        board = position.board
+        promotion_row = PROMOTION_ROW[position.turn]
+        margin = self.evaluator.delta_margin if self.use_alpha_beta else None
+        noisy = []
+        for move in self.generate_noisy(position):
+            gain = -SIGNED_VALUES[board[move & 31]] * position.turn
+            if abs(board[move >> 5]) == PAWN and (move & 31) // SIZE == promotion_row:
+                gain += PROMOTION_GAIN
+            # Delta pruning, the capture cannot reach the window even with the margin
+            if margin is not None and (v + gain + margin <= alpha if maximizingPlayer else v - gain - margin >= beta):
+                continue
+            noisy.append((gain * 8 - abs(board[move >> 5]), move))
+        # Most valuable victim first, then least valuable attacker
+        noisy.sort(reverse=True)
+
+        for _, move in noisy:
+            if self.qnodes >= self.quiescence_nodes:
+                break
+            self.nodes += 1
+            self.qnodes += 1
+            if not self.nodes & 255 and time.time() > self.deadline:
+                raise SearchTimeout()
+            undo = position.make_move(move)
+            score = self.quiescence(position, alpha, beta, not maximizingPlayer)
+            position.unmake_move(move, undo)
+            if maximizingPlayer:
+                v = max(v, score)
+                alpha = max(alpha, v)
+            else:
+                v = min(v, score)
+                beta = min(beta, v)
+            if self.use_alpha_beta and beta <= alpha:
+                break
+        return v
   
+# Leaves of the tree engine waiting on a batched evaluation, kept as their
+# parent's board and the moves from it, a leaf's own board is never built
+class LeafBatch:
+    def __init__(self):
+        self.parents = []       # parent nodes in the order they were expanded
+        self.boards = array('b') # their boards back to back
+        self.moves = []         # per parent, the moves of its pending leaves
+        self.leaves = []        # per parent, the pending leaves in the same order
+        self.count = 0
+
+    def __len__(self):
+        return self.count
+
+    def add(self, parent, moves, leaves):
+        self.parents.append(parent)
+        self.boards.extend(parent.game_state.board)
+        self.moves.append(moves)
+        self.leaves.append(leaves)
+        self.count += len(moves)
+
+    def clear(self):
+        self.parents.clear()
+        del self.boards[:]
+        self.moves.clear()
+        self.leaves.clear()
+        self.count = 0
+
 # Tree node for Minimax
 class MinimaxTreeNode:
     def __init__(self, game_state, evaluator, maxDepth, move=None, depth=0, is_maximizing=False):
@@ -116,19 +727,61 @@ class MinimaxTreeNode:
         self.score = None
         self.evaluator = evaluator
         self.maxDepth = maxDepth
+        self.best_child = None
 
-    def generate_children(self, game):
+    def generate_children(self, game, orderer=None, leaf_score=None, pending=None, evaluate=None):
+        evaluate = evaluate or self.evaluator.evaluate
         # Generate valid moves based on the current game state
         valid_moves = game.valid_moves(self.game_state)        
+        if orderer is not None:
+            valid_moves = orderer.order(self.game_state, valid_moves, self.depth)
+        if pending is not None and self.depth + 1 >= self.maxDepth:
+            self.batch_children(valid_moves, game, pending, evaluate)
+            return
         # For each valid move, create a child node
         for move in valid_moves:
-            new_game_state = copy.deepcopy(self.game_state)
-            game.make_move(new_game_state, move)
+            # Make/unmake on the parent's state, only interior children keep a snapshot
+            undo = game.make_move(self.game_state, move)
+            # A captured king ends the game, so that child is a leaf too
+            is_leaf = self.depth + 1 >= self.maxDepth or self.game_state.outcome
+            new_game_state = self.game_state if is_leaf else self.game_state.copy()
             child_node = MinimaxTreeNode(new_game_state, self.evaluator ,self.maxDepth, move, self.depth + 1, not self.is_maximizing)
            
             # Max depth reached, evaluate node
-            if child_node.depth >= self.maxDepth: 
-                child_node.score = self.evaluator.evaluate(child_node.game_state)
-            
+            if is_leaf: 
+                child_node.score = leaf_score(child_node.game_state, child_node.is_maximizing) \
+                    if leaf_score is not None and not child_node.game_state.outcome \
+                    else evaluate(child_node.game_state)
+                child_node.game_state = None
+            game.unmake_move(self.game_state, move, undo)
+
             # Add the child node to the current node's children
             self.children.append(child_node)
+
+    """
+    Create the leaf children of a node one ply above the horizon, to be scored in a batch
+
+    No move is played, the batch plays them all at once when it is scored. A
+    king capture ends the game and is scored right away.
+
+    Args:
+        - valid_moves:  list | Ordered moves of this node
+        - game:         MiniChess | Makes and unmakes moves on the state
+        - pending:      LeafBatch | Where the other leaves wait
+        - evaluate:     function | Static evaluation of a king capture
+    """
+    def batch_children(self, valid_moves, game, pending, evaluate):
+        board = self.game_state.board
+        moves, leaves = [], []
+        for move in valid_moves:
+            child_node = MinimaxTreeNode(None, self.evaluator, self.maxDepth, move, self.depth + 1, not self.is_maximizing)
+            if board[move & 31] in (KING, -KING):
+                undo = game.make_move(self.game_state, move)
+                child_node.score = evaluate(self.game_state)
+                game.unmake_move(self.game_state, move, undo)
+            else:
+                moves.append(move)
+                leaves.append(child_node)
+            self.children.append(child_node)
+        if moves:
+            pending.add(self, moves, leaves)
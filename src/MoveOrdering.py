@@ -0,0 +1,107 @@
+from Position import EMPTY, PAWN, QUEEN, SIZE, PROMOTION_ROW
+
+MAX_PLY: int = 64
+KILLER_SLOTS: int = 2
+
+# Score bands, a band always sorts ahead of the ones below it
+HASH_MOVE: int = 1 << 30
+CAPTURE:   int = 1 << 24
+KILLER:    int = 1 << 22
+
+"""
+Orders moves so alpha-beta meets the refutation early
+
+    1. the hash move (transposition table or previous iteration)
+    2. captures and promotions, most valuable victim first then least valuable attacker
+    3. killer moves, quiet moves that caused a cutoff at the same ply
+    4. remaining quiet moves by history score
+
+The history table is indexed by encoded move and persists across iterations
+and turns, it is halved at the start of each search so old results fade.
+"""
+class MoveOrderer:
+    def __init__(self):
+        self.killers = [[0] * KILLER_SLOTS for _ in range(MAX_PLY)]
+        self.history = [0] * 1024
+        self.cutoffs = 0
+        self.first_move_cutoffs = 0
+
+    """
+    Start a new search, killers are position specific and history fades
+    """
+    def new_search(self):
+        for slots in self.killers:
+            slots[:] = [0] * KILLER_SLOTS
+        self.history = [score >> 1 for score in self.history]
+        self.cutoffs = 0
+        self.first_move_cutoffs = 0
+
+    """
+    Sort moves in place, best candidates first
+
+    Args:
+        - position: Position | Position the moves belong to
+        - moves:    list | Encoded moves
+        - ply:      int | Distance from the root
+        - hash_move: int | Move searched first when it is in the list
+    Returns:
+        - moves:    list | The same list, sorted
+    """
+    def order(self, position, moves, ply, hash_move=None):
+        board = position.board
+        promotion_row = PROMOTION_ROW[position.turn]
+        killers = self.killers[ply] if ply < MAX_PLY else ()
+        history = self.history
+
+        def score(move):
+            if move == hash_move:
+                return HASH_MOVE
+            victim = board[move & 31]
+            attacker = abs(board[move >> 5])
+            if victim != EMPTY:
+                return CAPTURE + abs(victim) * 8 - attacker
+            if attacker == PAWN and (move & 31) // SIZE == promotion_row:
+                return CAPTURE + QUEEN * 8 - PAWN
+            if move in killers:
+                return KILLER - killers.index(move)
+            return history[move]
+
+        moves.sort(key=score, reverse=True)
+        return moves
+
+    """
+    Record the move that caused a beta cutoff
+
+    Args:
+        - position: Position | Position the move was played from
+        - move:     int | The encoded move
+        - depth:    int | Remaining depth, deeper cutoffs weigh more in the history
+        - ply:      int | Distance from the root
+        - index:    int | Position of the move in the ordered list
+    """
+    def record_cutoff(self, position, move, depth, ply, index):
+        self.cutoffs += 1
+        if index == 0:
+            self.first_move_cutoffs += 1
+
+        # Captures are already ordered by MVV-LVA
+        if position.board[move & 31] != EMPTY:
+            return
+        if ply < MAX_PLY:
+            killers = self.killers[ply]
+            if killers[0] != move:
+                killers[1:] = killers[:-1]
+                killers[0] = move
+        self.history[move] += depth * depth
+        # Keep history scores below the killer band
+        if self.history[move] >= KILLER:
+            self.history = [score >> 1 for score in self.history]
+
+    """
+    Share of cutoffs produced by the first move searched, 1.0 is perfect ordering
+    """
+    def first_move_cutoff_rate(self):
+        return self.first_move_cutoffs / self.cutoffs if self.cutoffs else 0.0
+
+    def report(self):
+        return f'{self.cutoffs} cutoffs, {self.first_move_cutoff_rate():.1%} on the first move'
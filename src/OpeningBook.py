@@ -0,0 +1,179 @@
+"""
+Opening book built offline from deep searches of the start position.
+
+The file is a short header followed by fixed size records (Zobrist hash, move,
+weight) sorted by hash, best weight first within a hash. The engine maps the
+file into memory and binary-searches it, nothing is read up front.
+"""
+import os
+import math
+import mmap
+import time
+import struct
+import argparse
+from collections import deque
+from Heuristics import HeuristicsEvaluator, HEURISTICS
+from Minimax import Minimax
+from MoveOrdering import MoveOrderer
+from Position import Position, WHITE, decode_move
+from TranspositionTable import TranspositionTable
+
+BOOK_FILE: str = os.path.join(os.path.dirname(os.path.abspath(__file__)), "book.bin")
+WEIGHT_SCALE: int = 1000 # Weight of the best move, weaker moves get less
+
+MAGIC: bytes = b"GFOB"
+VERSION: int = 1
+HEADER = struct.Struct("<4sHI") # magic, version, record count
+RECORD = struct.Struct("<QHH")  # position hash, encoded move, weight
+
+"""
+Read-only view of a book file
+
+Args:
+    - path: string | File written by build
+"""
+class OpeningBook:
+    def __init__(self, path=BOOK_FILE):
+        self.path = path
+        self.file = open(path, 'rb')
+        self.data = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, self.count = HEADER.unpack_from(self.data, 0)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"{path} is not a version {VERSION} opening book")
+
+    def _key(self, index):
+        return struct.unpack_from("<Q", self.data, HEADER.size + index * RECORD.size)[0]
+
+    """
+    Book moves for a position hash
+
+    Returns:
+        - entries: list | (move, weight) pairs, best first, empty when the position is not in the book
+    """
+    def lookup(self, key):
+        low, high = 0, self.count
+        while low < high:
+            middle = (low + high) // 2
+            if self._key(middle) < key:
+                low = middle + 1
+            else:
+                high = middle
+        entries = []
+        while low < self.count:
+            record_key, move, weight = RECORD.unpack_from(self.data, HEADER.size + low * RECORD.size)
+            if record_key != key:
+                break
+            entries.append((move, weight))
+            low += 1
+        return entries
+
+    """
+    Pick a book move, the heaviest one or a weighted random one
+
+    Args:
+        - position: Position | Position to look up
+        - rng:      random.Random | Source for a weighted choice, None plays the best move
+    Returns:
+        - move: int | Encoded move, None when out of book
+    """
+    def choose(self, position, rng=None):
+        entries = self.lookup(position.hash)
+        # A hash collision must never produce an illegal move
+        legal = position.valid_moves()
+        entries = [(move, weight) for move, weight in entries if move in legal]
+        if not entries:
+            return None
+        if rng is None:
+            return entries[0][0]
+        return rng.choices([move for move, _ in entries], [weight for _, weight in entries])[0]
+
+    def close(self):
+        self.data.close()
+        self.file.close()
+
+"""
+Score every root move with a full window search
+
+Returns:
+    - scores: list | (score for the side to move, move), best first
+"""
+def score_moves(engine, position, depth):
+    maximizing = position.turn == WHITE
+    # Fills the transposition table and move ordering for the per-move searches
+    engine.find_move(position, depth, maximizing)
+    engine.deadline = math.inf
+    engine.root_depth = depth
+    scores = []
+    for move in position.valid_moves():
+        undo = position.make_move(move)
+        engine.qnodes = 0
+        score = engine.alphabeta(position, depth - 1, -math.inf, math.inf, not maximizing)
+        position.unmake_move(move, undo)
+        scores.append((score * position.turn, move))
+    scores.sort(key=lambda entry: entry[0], reverse=True)
+    return scores
+
+"""
+Build a book from the start position
+
+Both sides follow book moves from the start, every position reached within
+`plies` gets its own entries. A move is kept when it scores within `margin`
+of the best move, weighted by how far behind it is.
+
+Args:
+    - path:         string | Output file
+    - plies:        int | Book depth in plies from the start position
+    - depth:        int | Search depth per position
+    - width:        int | Most moves kept per position
+    - margin:       float | Largest score gap to the best move, in evaluation units
+    - heuristic:    string | Heuristic name
+    - log:          function | Progress output
+"""
+def build(path=BOOK_FILE, plies=8, depth=7, width=2, margin=0.5, heuristic="e2", log=print):
+    from MiniChess import MiniChess
+    engine = Minimax(None, HeuristicsEvaluator(None, heuristic), True, math.inf, "dfs", depth,
+                     TranspositionTable(64), MoveOrderer())
+    start = Position.from_state(MiniChess.init_board())
+    queue = deque([(start, 0)])
+    book = {start.hash: None}
+
+    while queue:
+        position, ply = queue.popleft()
+        started = time.time()
+        scores = score_moves(engine, position, depth)
+        best = scores[0][0]
+        entries = [(move, max(1, round(WEIGHT_SCALE / (1 + best - score))))
+                   for score, move in scores[:width] if best - score <= margin]
+        book[position.hash] = entries
+        log(f'ply {ply} {position.to_text()}: ' +
+            ', '.join(f'{engine.convert_to_notation(*decode_move(move))} ({weight})' for move, weight in entries) +
+            f' {time.time() - started:.1f}s')
+
+        if ply + 1 >= plies:
+            continue
+        for move, _ in entries:
+            child = position.copy()
+            child.make_move(move)
+            if not child.outcome and child.hash not in book:
+                book[child.hash] = None
+                queue.append((child, ply + 1))
+
+    records = sorted(((key, move, weight) for key, entries in book.items() for move, weight in entries or ()),
+                     key=lambda record: (record[0], -record[2]))
+    with open(path, 'wb') as out:
+        out.write(HEADER.pack(MAGIC, VERSION, len(records)))
+        for record in records:
+            out.write(RECORD.pack(*record))
+    log(f'{len(records)} moves for {sum(1 for entries in book.values() if entries)} positions written to {path}')
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build the opening book")
+    parser.add_argument("--output", type=str, default=BOOK_FILE, help="Book file (default: book.bin next to this script)")
+    parser.add_argument("--plies", type=int, default=8, help="Book depth in plies from the start position (default: 8)")
+    parser.add_argument("--depth", type=int, default=7, help="Search depth per position (default: 7)")
+    parser.add_argument("--width", type=int, default=2, help="Most moves kept per position (default: 2)")
+    parser.add_argument("--margin", type=float, default=0.5, help="Largest score gap to the best move (default: 0.5)")
+    parser.add_argument("--heuristic", type=str, choices=HEURISTICS, default="e2", help="Heuristic to search with (default: e2)")
+    args = parser.parse_args()
+
+    build(args.output, args.plies, args.depth, args.width, args.margin, args.heuristic)
@@ -0,0 +1,211 @@
+import math
+import time
+import argparse
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from Heuristics import HeuristicsEvaluator, HEURISTICS
+from Minimax import Minimax, SearchTimeout, MAX_DEPTH, QUIESCENCE_NODES, ASPIRATION_WINDOW
+from MoveOrdering import MoveOrderer
+from Position import Position
+from TranspositionTable import TranspositionTable, EXACT
+from Tablebase import Tablebase
+
+"""
+Worker process state
+
+Each worker keeps its own engine, transposition table and move orderer for the
+lifetime of the pool, so they stay warm across iterations and turns. They are
+aged once per search, the first time a worker sees a new search id.
+"""
+_worker = None
+_shared_bound = None
+_search_id = None
+
+def _init_worker(heuristic, weights, use_alpha_beta, tt_mb, move_ordering, quiescence_nodes, tablebase_path, pvs, null_move, lmr, futility,
+                 shared_bound):
+    global _worker, _shared_bound
+    evaluator = HeuristicsEvaluator(None, heuristic, weights=weights)
+    _worker = Minimax(None, evaluator, use_alpha_beta, math.inf, "dfs", MAX_DEPTH,
+                      TranspositionTable(tt_mb) if tt_mb > 0 else None,
+                      MoveOrderer() if move_ordering else None, None, quiescence_nodes,
+                      Tablebase(tablebase_path) if tablebase_path else None, False, pvs, ASPIRATION_WINDOW, null_move, lmr, futility)
+    _shared_bound = shared_bound
+
+"""
+Search one root move in a worker
+
+The window is read from the shared bound when the task starts, so moves
+picked up later benefit from the best score found so far by any worker.
+
+Returns:
+    - result: tuple | (move, score, nodes), score is None when the deadline passed
+"""
+def _search_root_move(board, turn, turns, capture, outcome, move, depth, maximizing_player, deadline, search_id):
+    global _search_id
+    if search_id != _search_id:
+        if _worker.tt is not None:
+            _worker.tt.new_search()
+        if _worker.orderer is not None:
+            _worker.orderer.new_search()
+        _search_id = search_id
+    position = Position(board, turn, turns, capture, outcome)
+    position.make_move(move)
+    _worker.deadline = deadline
+    _worker.root_depth = depth
+    _worker.nodes = 0
+    _worker.qnodes = 0
+    bound = _shared_bound.value
+    alpha, beta = (bound, math.inf) if maximizing_player else (-math.inf, bound)
+    try:
+        score = _worker.alphabeta(position, depth - 1, alpha, beta, not maximizing_player)
+    except SearchTimeout:
+        score = None
+    return move, score, _worker.nodes
+
+"""
+Root-splitting parallel search
+
+Iterative deepening runs in the calling process. Every iteration searches the
+first root move alone to establish a bound, then spreads the remaining root
+moves over the worker processes. Workers share that bound through shared memory
+and each result tightens it for the moves that start after it. Processes sidestep
+the GIL, so each worker gets a core of its own.
+
+Every worker is a pool of one process, so a root move goes to the same worker
+on every iteration of a search and finds the entries its earlier iterations
+left in that worker's transposition table.
+"""
+class ParallelMinimax(Minimax):
+    def __init__(self, game, evaluator, use_alpha_beta=True, time_limit=5, max_depth=MAX_DEPTH,
+                 tt=None, orderer=None, workers=2, tt_mb=16, stats=None, quiescence_nodes=QUIESCENCE_NODES, tablebase=None,
+                 pvs=False, aspiration=ASPIRATION_WINDOW, null_move=0, lmr=0, futility=0):
+        super().__init__(game, evaluator, use_alpha_beta, time_limit, "dfs", max_depth, tt, orderer, stats,
+                         quiescence_nodes, tablebase, False, pvs, aspiration, null_move, lmr, futility)
+        self.workers = workers
+        # Counts find_move calls, workers age their tables when it changes
+        self.search_id = 0
+        self.shared_bound = multiprocessing.Value('d', 0.0, lock=False)
+        self.pools = [ProcessPoolExecutor(
+            max_workers=1,
+            initializer=_init_worker,
+            initargs=(evaluator.heuristic, evaluator.weights_file, use_alpha_beta, tt_mb, orderer is not None, quiescence_nodes,
+                      tablebase.path if tablebase is not None else None, self.pvs, null_move, lmr, futility, self.shared_bound)
+        ) for _ in range(workers)]
+        # Worker index per root move, for the root position of root_key
+        self.assigned = {}
+        self.root_key = None
+
+    def find_move(self, position, depth, maximizing_player):
+        self.search_id += 1
+        return super().find_move(position, depth, maximizing_player)
+
+    def search(self, position, depth, maximizing_player, first_move=None):
+        # Depth 1 is cheaper than a round trip to the pool and must always complete
+        if depth == 1:
+            return super().search(position, depth, maximizing_player, first_move)
+
+        self.nodes = 1
+        self.qnodes = 0
+        self.root_depth = depth
+        moves = self.order_moves(position, position.valid_moves(), 0, first_move or self.tt_move(position))
+        if not moves:
+            return None
+
+        if position.hash != self.root_key:
+            self.assigned, self.root_key = {}, position.hash
+        for move in moves:
+            # Spread in the order moves are first seen, then kept
+            self.assigned.setdefault(move, len(self.assigned) % self.workers)
+
+        self.shared_bound.value = -math.inf if maximizing_player else math.inf
+        args = (position.board, position.turn, position.turns, position.capture, position.outcome)
+        best_move, v = None, -math.inf if maximizing_player else math.inf
+
+        def submit(move):
+            return self.pools[self.assigned[move]].submit(_search_root_move, *args, move, depth, maximizing_player, self.deadline,
+                                    self.search_id)
+
+        pending = {submit(moves[0])}
+        queued = moves[1:]
+        try:
+            while pending:
+                done, pending = wait(pending, timeout=max(0.0, self.deadline - time.time()) if self.deadline < math.inf else None,
+                                     return_when=FIRST_COMPLETED)
+                if not done:
+                    raise SearchTimeout()
+                for future in done:
+                    move, score, nodes = future.result()
+                    self.nodes += nodes
+                    if score is None:
+                        raise SearchTimeout()
+                    if best_move is None or (score > v if maximizing_player else score < v):
+                        v, best_move = score, move
+                        self.shared_bound.value = v
+                # The first move sets the bound, then every other root move goes out at once
+                if queued:
+                    pending |= {submit(move) for move in queued}
+                    queued = []
+        except SearchTimeout:
+            for future in pending:
+                future.cancel()
+            raise
+
+        if self.tt is not None:
+            self.tt.store(position.hash, depth, v, EXACT, best_move)
+        self.root_score = v
+        return best_move
+
+    def shutdown(self):
+        for pool in self.pools:
+            pool.shutdown(wait=True, cancel_futures=True)
+
+"""
+Measure time to a fixed depth against the worker count
+
+Args:
+    - depth:        int | Fixed search depth
+    - worker_counts: list | Worker counts to compare, 1 runs the sequential engine
+    - heuristic:    string | Heuristic name
+Returns:
+    - results:      list | (workers, seconds, nodes, speedup) per worker count
+"""
+def measure_speedup(depth, worker_counts, heuristic="e0"):
+    from MiniChess import MiniChess
+    state = MiniChess.init_board()
+
+    results = []
+    baseline = None
+    for workers in worker_counts:
+        evaluator = HeuristicsEvaluator(None, heuristic)
+        if workers == 1:
+            engine = Minimax(None, evaluator, True, math.inf, "dfs", depth, TranspositionTable(16), MoveOrderer())
+        else:
+            engine = ParallelMinimax(None, evaluator, True, math.inf, depth, TranspositionTable(16), MoveOrderer(), workers)
+            # Start the worker processes outside the measurement
+            for pool in engine.pools:
+                pool.submit(int).result()
+
+        start = time.time()
+        engine.start_time = start
+        nodes = 0
+        for d in range(1, depth + 1):
+            engine.search(Position.from_state(state), d, True, None)
+            nodes += engine.nodes
+        elapsed = time.time() - start
+        if workers != 1:
+            engine.shutdown()
+
+        baseline = baseline or elapsed
+        results.append((workers, elapsed, nodes, baseline / elapsed))
+    return results
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Measure parallel search speedup")
+    parser.add_argument("--depth", type=int, default=8, help="Fixed search depth (default: 8)")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4], help="Worker counts to compare (default: 1 2 4)")
+    parser.add_argument("--heuristic", type=str, choices=HEURISTICS, default="e0", help="Heuristic to search with (default: e0)")
+    args = parser.parse_args()
+
+    print(f'{"workers":>8} {"seconds":>9} {"nodes":>10} {"speedup":>8}')
+    for workers, elapsed, nodes, speedup in measure_speedup(args.depth, args.workers, args.heuristic):
+        print(f'{workers:>8} {elapsed:>9.3f} {nodes:>10} {speedup:>7.2f}x')
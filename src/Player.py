@@ -1,4 +1,12 @@
-from Minimax import Minimax
+import math
+import time
+from Minimax import Minimax, MAX_DEPTH, QUIESCENCE_NODES, ASPIRATION_WINDOW
+from TranspositionTable import TranspositionTable
+from MoveOrdering import MoveOrderer
+from Parallel import ParallelMinimax
+from Telemetry import SearchStats
+from Position import Position, WHITE, encode_move, decode_move
+from Ponder import Ponderer
 
 
 class Player:
@@ -11,11 +19,97 @@ class Human(Player):
         return move
     
 class AI(Player):
-    def __init__(self, use_alpha_beta, time_limit, evaluator):
+    def __init__(self, use_alpha_beta, time_limit, evaluator, engine="dfs", max_depth=MAX_DEPTH, tt_mb=16, move_ordering=True, workers=1, stats=None,
+                 quiescence_nodes=QUIESCENCE_NODES, tablebase=None, book=None, batch_eval=False, ponder=False, pvs=False, aspiration=ASPIRATION_WINDOW,
+                 null_move=0, lmr=0, futility=0):
         self.use_alpha_beta = use_alpha_beta
         self.time_limit = time_limit
         self.evaluator = evaluator
+        self.engine = engine
+        self.max_depth = max_depth
+        self.quiescence_nodes = quiescence_nodes
+        self.tablebase = tablebase
+        self.book = book
+        self.batch_eval = batch_eval
+        # Kept across turns so positions searched on earlier moves are reused
+        self.tt = TranspositionTable(tt_mb) if tt_mb > 0 else None
+        self.orderer = MoveOrderer() if move_ordering else None
+        self.stats = SearchStats(stats) if stats else None
+        # Built once and reused every turn, the worker pool too when there is one
+        search_options = dict(use_alpha_beta=use_alpha_beta, time_limit=time_limit, max_depth=max_depth, tt=self.tt, orderer=self.orderer,
+                              stats=self.stats, quiescence_nodes=quiescence_nodes, tablebase=tablebase, pvs=pvs, aspiration=aspiration,
+                              null_move=null_move, lmr=lmr, futility=futility)
+        self.minimax = ParallelMinimax(None, evaluator, workers=workers, tt_mb=tt_mb, **search_options) \
+            if workers > 1 else \
+            Minimax(None, evaluator, engine=engine, batch_eval=batch_eval, **search_options)
+        # Searches on the opponent's time into the shared table, its own results are never played
+        self.ponderer = Ponderer(Minimax(None, evaluator, use_alpha_beta, math.inf, "dfs", max_depth, self.tt, self.orderer, None,
+                                         quiescence_nodes, tablebase, null_move=null_move, lmr=lmr, futility=futility)) \
+            if ponder else None
+        self.predicted = None
+
     def make_move(self,game):
-        minimax = Minimax(game, self.evaluator, self.use_alpha_beta,self.time_limit)
-        move = minimax.getMove(game.current_game_state, 3, False) if game.current_game_state['turn'] == "white" else minimax.getMove(game.current_game_state, 3, True)
+        if self.ponderer is not None:
+            self.stop_pondering(game)
+        move = self.choose_move(game)
+        if self.ponderer is not None and move is not None:
+            self.start_pondering(game, move)
+        return move
+
+    """
+    Ponder the position after the reply the last search expects, or every reply
+    when the table has no prediction
+
+    Args:
+        - game: MiniChess | The game, before move is played
+        - move: string | The move about to be played in letter number form
+    """
+    def start_pondering(self, game, move):
+        position = Position.from_state(game.current_game_state)
+        position.make_move(encode_move(*game.parse_input(move)))
+        self.predicted = None
+        if position.outcome:
+            return
+        reply = self.tt.best_move(position.hash) if self.tt is not None else None
+        if reply and reply in position.valid_moves():
+            position.make_move(reply)
+            if position.outcome:
+                return
+            self.predicted = position.hash
+        self.ponderer.start(position, position.turn == WHITE)
+
+    """
+    Stop pondering before searching or exiting, the game is None on exit
+    """
+    def stop_pondering(self, game=None):
+        pondered, depth = self.ponderer.stop()
+        if pondered is None or game is None:
+            return
+        if self.predicted is None:
+            result = 'all replies'
+        elif self.predicted == Position.from_state(game.current_game_state).hash:
+            result = 'hit'
+        else:
+            result = 'miss'
+        game.log(f'Pondered {pondered.to_text()} to depth {depth}: {result}')
+
+    def choose_move(self,game):
+        minimax = self.minimax
+        minimax.game = game
+        # Book positions are answered without searching
+        if self.book is not None:
+            move = self.book.choose(Position.from_state(game.current_game_state))
+            if move is not None:
+                move = minimax.convert_to_notation(*decode_move(move))
+                print(f'{game.current_game_state["turn"].capitalize()} to move: {move} (book)')
+                return move
+        # Evaluations are scored from white's point of view, depth grows until time_limit is spent
+        start = time.time()
+        move = minimax.getMove(game.current_game_state, None, game.current_game_state['turn'] == "white")
+        if self.stats is not None and move is not None:
+            record = self.stats.record(minimax, move, time.time() - start)
+            record["turn"] = game.current_game_state["turns"]
+            record["color"] = game.current_game_state["turn"]
+            game.log(self.stats.summary(record))
+            game.telemetry.append(self.stats.to_json(record))
         return move
\ No newline at end of file
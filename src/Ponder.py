@@ -0,0 +1,69 @@
+import math
+import threading
+from Minimax import SearchTimeout
+
+"""
+Search on the opponent's time
+
+While the human thinks, a background thread deepens a search of the position
+after the predicted reply, or of the position the human is to move in when
+there is no prediction, which covers every reply. The pondering engine shares
+the AI's transposition table and move orderer and never reports a move: when
+the human's move arrives the thread is stopped and joined, then the AI runs its
+normal search, which finds the pondered lines in the table. A mispredicted
+position has a different hash, so its entries are simply never hit.
+
+Args:
+    - engine: Minimax | Engine sharing the AI's table and orderer, used only by the thread
+"""
+class Ponderer:
+    def __init__(self, engine):
+        self.engine = engine
+        self.thread = None
+        self.stopping = threading.Event()
+        self.position = None
+        self.depth = 0
+
+    """
+    Start pondering a position, the previous ponder must have been stopped
+
+    Args:
+        - position:             Position | Position to search, copied
+        - maximizing_player:    bool | True when the side to move in position is white
+    """
+    def start(self, position, maximizing_player):
+        self.position = position.copy()
+        self.depth = 0
+        self.stopping.clear()
+        self.engine.deadline = math.inf
+        self.thread = threading.Thread(target=self._run, args=(self.position.copy(), maximizing_player), daemon=True)
+        self.thread.start()
+
+    def _run(self, position, maximizing_player):
+        for depth in range(1, self.engine.max_depth + 1):
+            if self.stopping.is_set():
+                return
+            try:
+                # A stop leaves the searched position mid-line, so search a copy
+                if self.engine.search(position.copy(), depth, maximizing_player) is None:
+                    return
+            except SearchTimeout:
+                return
+            self.depth = depth
+
+    """
+    Stop the thread and wait for it, safe to call when nothing is pondering
+
+    Returns:
+        - (position, depth): tuple | What was pondered and the deepest completed iteration, (None, 0) if idle
+    """
+    def stop(self):
+        if self.thread is None:
+            return None, 0
+        self.stopping.set()
+        # The search checks its deadline every few hundred nodes and unwinds
+        self.engine.deadline = -math.inf
+        self.thread.join()
+        self.thread = None
+        position, self.position = self.position, None
+        return position, self.depth
@@ -0,0 +1,632 @@
+"""
+Compact position representation for the 5x5 board.
+
+The board is a flat list of 25 small integers indexed by square = row * 5 + col,
+where row 0 is rank 5 (black's back rank) just like the dictionary board.
+White pieces are positive, black pieces are negative and empty squares are 0,
+so `piece * color > 0` tests ownership without any string handling.
+
+Moves are encoded as a single integer (from_square << 5) | to_square.
+"""
+import random
+
+EMPTY:  int = 0
+PAWN:   int = 1
+KNIGHT: int = 2
+BISHOP: int = 3
+QUEEN:  int = 4
+KING:   int = 5
+
+WHITE: int = 1
+BLACK: int = -1
+
+SIZE:    int = 5
+SQUARES: int = SIZE * SIZE
+
+COLOR_NAMES:  dict = {WHITE: "white", BLACK: "black"}
+COLOR_CODES:  dict = {"white": WHITE, "black": BLACK}
+PIECE_CODES:  dict = {'p': PAWN, 'N': KNIGHT, 'B': BISHOP, 'Q': QUEEN, 'K': KING}
+TEXT_LETTERS:  str = ".PNBQK"
+TEXT_CODES:    dict = {letter: code for code, letter in enumerate(TEXT_LETTERS) if code}
+
+# Board cell strings <-> piece integers
+CELL_TO_PIECE: dict = {'.': EMPTY}
+for _letter, _code in PIECE_CODES.items():
+    CELL_TO_PIECE['w' + _letter] = _code
+    CELL_TO_PIECE['b' + _letter] = -_code
+PIECE_TO_CELL: dict = {piece: cell for cell, piece in CELL_TO_PIECE.items()}
+
+def square(row: int, col: int) -> int:
+    return row * SIZE + col
+
+def encode_move(start, end) -> int:
+    return (square(*start) << 5) | square(*end)
+
+def decode_move(move: int):
+    start, end = move >> 5, move & 31
+    return (divmod(start, SIZE), divmod(end, SIZE))
+
+"""
+Precomputed move tables
+
+Direction lists are (x_dir, y_dir) and follow the same order as the generators
+in MiniChess so both representations produce moves in the same order.
+"""
+KING_DIRECTIONS:   list = [(-1, 1), (0, 1), (1, 1), (-1, 0), (1, 0), (-1, -1), (0, -1), (1, -1)]
+KNIGHT_DIRECTIONS: list = [(2, -1), (2, 1), (1, 2), (-1, 2), (-2, 1), (-2, -1), (-1, -2), (1, -2)]
+BISHOP_DIRECTIONS: list = [(1, 1), (-1, -1), (1, -1), (-1, 1)]
+ROOK_DIRECTIONS:   list = [(1, 0), (-1, 0), (0, 1), (0, -1)]
+
+def _on_board(x: int, y: int) -> bool:
+    return 0 <= x < SIZE and 0 <= y < SIZE
+
+def _step_table(directions):
+    table = []
+    for sq in range(SQUARES):
+        y, x = divmod(sq, SIZE)
+        table.append(tuple(square(y + dy, x + dx) for dx, dy in directions if _on_board(x + dx, y + dy)))
+    return tuple(table)
+
+def _ray_table(directions):
+    table = []
+    for sq in range(SQUARES):
+        y, x = divmod(sq, SIZE)
+        rays = []
+        for dx, dy in directions:
+            ray = []
+            i, j = x + dx, y + dy
+            while _on_board(i, j):
+                ray.append(square(j, i))
+                i, j = i + dx, j + dy
+            if ray:
+                rays.append(tuple(ray))
+        table.append(tuple(rays))
+    return tuple(table)
+
+def _pawn_tables(direction):
+    pushes, captures = [], []
+    for sq in range(SQUARES):
+        y, x = divmod(sq, SIZE)
+        pushes.append(square(y + direction, x) if _on_board(x, y + direction) else -1)
+        captures.append(tuple(square(y + direction, x + dx) for dx in (-1, 1) if _on_board(x + dx, y + direction)))
+    return tuple(pushes), tuple(captures)
+
+KING_TARGETS:   tuple = _step_table(KING_DIRECTIONS)
+KNIGHT_TARGETS: tuple = _step_table(KNIGHT_DIRECTIONS)
+BISHOP_STEPS:   tuple = _step_table(BISHOP_DIRECTIONS)
+BISHOP_RAYS:    tuple = _ray_table(BISHOP_DIRECTIONS)
+QUEEN_RAYS:     tuple = _ray_table(BISHOP_DIRECTIONS + ROOK_DIRECTIONS)
+
+"""
+Single-move legality lookups
+
+Reach sets answer "can this piece jump there" in O(1). Between tables are
+indexed by from_square * SQUARES + to_square and hold the squares strictly
+between the two on a line the piece moves along, or None when it cannot get
+there at all on an empty board.
+"""
+def _between_table(ray_table):
+    table = [None] * (SQUARES * SQUARES)
+    for sq, rays in enumerate(ray_table):
+        for ray in rays:
+            for i, target in enumerate(ray):
+                table[sq * SQUARES + target] = ray[:i]
+    return tuple(table)
+
+KING_REACH:     tuple = tuple(frozenset(targets) for targets in KING_TARGETS)
+KNIGHT_REACH:   tuple = tuple(frozenset(targets) for targets in KNIGHT_TARGETS)
+BISHOP_BETWEEN: tuple = _between_table(BISHOP_RAYS)
+QUEEN_BETWEEN:  tuple = _between_table(QUEEN_RAYS)
+
+# Indexed by color: index 1 is white, index -1 (the last slot) is black
+_WHITE_PUSH, _WHITE_CAPTURES = _pawn_tables(-1)
+_BLACK_PUSH, _BLACK_CAPTURES = _pawn_tables(1)
+PAWN_PUSH:     tuple = (None, _WHITE_PUSH, _BLACK_PUSH)
+PAWN_CAPTURES: tuple = (None, _WHITE_CAPTURES, _BLACK_CAPTURES)
+PROMOTION_ROW: tuple = (None, 0, SIZE - 1)
+
+"""
+Zobrist keys
+
+One random 64-bit key per (piece, square), indexed like the board so black
+pieces wrap to the end of the list, plus a key for black to move.
+The seed is fixed so hashes are stable across runs and processes.
+"""
+_zobrist_random = random.Random(0x5EED)
+ZOBRIST: tuple = tuple(
+    tuple(0 if piece == EMPTY else _zobrist_random.getrandbits(64) for _ in range(SQUARES))
+    for piece in list(range(KING + 1)) + list(range(-KING, 0))
+)
+ZOBRIST_BLACK: int = _zobrist_random.getrandbits(64)
+
+"""
+Evaluation terms kept as running sums by make_move/unmake_move
+
+Material values and piece-square tables are indexed like the board and are
+signed (positive favours white). Piece-square values are in tenths of a pawn
+and kept as integers so the running sum always equals a full recompute.
+Tables are written from white's side, row 0 being the promotion row, and
+mirrored for black.
+"""
+PIECE_VALUES: dict = {'p': 1, 'B': 3, 'N': 3, 'Q': 9, 'K': 999}
+SIGNED_VALUES: list = [0] * 11
+for _letter, _code in PIECE_CODES.items():
+    SIGNED_VALUES[_code] = PIECE_VALUES[_letter]
+    SIGNED_VALUES[-_code] = -PIECE_VALUES[_letter]
+
+_WHITE_PIECE_SQUARE: dict = {
+    PAWN: [ 0,  0,  0,  0,  0,
+            6,  6,  7,  6,  6,
+            2,  3,  4,  3,  2,
+            0,  1,  1,  1,  0,
+            0,  0,  0,  0,  0],
+    KNIGHT: [-3, -1,  0, -1, -3,
+             -1,  1,  2,  1, -1,
+              0,  2,  4,  2,  0,
+             -1,  1,  2,  1, -1,
+             -3, -1,  0, -1, -3],
+    BISHOP: [-1,  0,  0,  0, -1,
+              0,  1,  1,  1,  0,
+              0,  1,  2,  1,  0,
+              0,  1,  1,  1,  0,
+             -1,  0,  0,  0, -1],
+    QUEEN: [0,  0,  0,  0,  0,
+            0,  1,  1,  1,  0,
+            0,  1,  2,  1,  0,
+            0,  1,  1,  1,  0,
+            0,  0,  0,  0,  0],
+    KING: [-3, -3, -3, -3, -3,
+           -2, -2, -2, -2, -2,
+           -1, -1, -1, -1, -1,
+            0,  0,  0,  0,  0,
+            1,  2,  1,  2,  1],
+}
+PIECE_SQUARE: list = [[0] * SQUARES for _ in range(11)]
+for _code, _table in _WHITE_PIECE_SQUARE.items():
+    for _sq in range(SQUARES):
+        _row, _col = divmod(_sq, SIZE)
+        PIECE_SQUARE[_code][_sq] = _table[_sq]
+        PIECE_SQUARE[-_code][_sq] = -_table[square(SIZE - 1 - _row, _col)]
+
+class Position:
+    __slots__ = ("board", "turn", "turns", "capture", "outcome", "hash", "material", "positional")
+
+    def __init__(self, board, turn=WHITE, turns=1, capture=0, outcome='', hash=None, material=None, positional=None):
+        self.board = board
+        self.turn = turn
+        self.turns = turns
+        self.capture = capture
+        self.outcome = outcome
+        self.hash = self.compute_hash() if hash is None else hash
+        self.material = self.compute_material() if material is None else material
+        self.positional = self.compute_positional() if positional is None else positional
+
+    def compute_material(self):
+        return sum(map(SIGNED_VALUES.__getitem__, self.board))
+
+    def compute_positional(self):
+        return sum(PIECE_SQUARE[piece][sq] for sq, piece in enumerate(self.board))
+
+    """
+    Zobrist hash of the board and side to move from scratch, make_move keeps it up to date
+
+    Returns:
+        - hash: int | 64-bit Zobrist hash
+    """
+    def compute_hash(self):
+        hash = ZOBRIST_BLACK if self.turn == BLACK else 0
+        for sq, piece in enumerate(self.board):
+            hash ^= ZOBRIST[piece][sq]
+        return hash
+
+    """
+    Build a compact position from the dictionary game state
+
+    Args:
+        - game_state:   dictionary | Dictionary representing the game state
+    Returns:
+        - position:     Position | The equivalent compact position
+    """
+    @classmethod
+    def from_state(cls, game_state):
+        board = [CELL_TO_PIECE[cell] for row in game_state["board"] for cell in row]
+        return cls(board, COLOR_CODES[game_state["turn"]], game_state["turns"],
+                   game_state["capture"], game_state["outcome"])
+
+    """
+    Convert back to the dictionary game state used by the display and the CLI
+
+    Returns:
+        - game_state:   dictionary | Dictionary representing the game state
+    """
+    def to_state(self):
+        cells = [PIECE_TO_CELL[piece] for piece in self.board]
+        return {
+            "board": [cells[row * SIZE:(row + 1) * SIZE] for row in range(SIZE)],
+            "turn": COLOR_NAMES[self.turn],
+            "turns": self.turns,
+            "capture": self.capture,
+            "outcome": self.outcome
+        }
+
+    """
+    Build a position from the compact text notation
+
+    Ranks 5 to 1 are separated by '/', white pieces are uppercase (K Q B N P),
+    black pieces lowercase and digits count empty squares. The side to move
+    (w or b) follows after a space. Ex: the start position is "kqbn1/2pp1/5/1PP2/1NBQK w"
+
+    Args:
+        - text:     string | The position in text notation
+    Returns:
+        - position: Position | The parsed position
+    Raises:
+        - ValueError if the notation is malformed
+    """
+    @classmethod
+    def from_text(cls, text):
+        fields = text.split()
+        if len(fields) != 2 or fields[1] not in ('w', 'b'):
+            raise ValueError(f"Expected '<ranks> <w|b>', got {text!r}")
+        ranks = fields[0].split('/')
+        board = []
+        for rank in ranks:
+            row = []
+            for char in rank:
+                if char.isdigit():
+                    row.extend([EMPTY] * int(char))
+                elif char.upper() in TEXT_CODES:
+                    row.append(TEXT_CODES[char.upper()] * (WHITE if char.isupper() else BLACK))
+                else:
+                    raise ValueError(f"Unknown piece {char!r} in {text!r}")
+            if len(row) != SIZE:
+                raise ValueError(f"Rank {rank!r} does not have {SIZE} squares in {text!r}")
+            board.extend(row)
+        if len(ranks) != SIZE:
+            raise ValueError(f"Expected {SIZE} ranks in {text!r}")
+        return cls(board, WHITE if fields[1] == 'w' else BLACK)
+
+    """
+    Write the position in the compact text notation, see from_text
+    """
+    def to_text(self):
+        ranks = []
+        for row in range(SIZE):
+            rank, empty = '', 0
+            for piece in self.board[row * SIZE:(row + 1) * SIZE]:
+                if piece == EMPTY:
+                    empty += 1
+                    continue
+                if empty:
+                    rank, empty = rank + str(empty), 0
+                letter = TEXT_LETTERS[abs(piece)]
+                rank += letter if piece > 0 else letter.lower()
+            ranks.append(rank + (str(empty) if empty else ''))
+        return '/'.join(ranks) + (' w' if self.turn == WHITE else ' b')
+
+    def copy(self):
+        return Position(self.board[:], self.turn, self.turns, self.capture, self.outcome,
+                        self.hash, self.material, self.positional)
+
+    """
+    Returns a list of valid moves
+
+    Args:
+        - color:    int | Side to generate moves for, defaults to the side to move
+    Returns:
+        - moves:    list | A list of encoded moves (from_square << 5) | to_square
+    """
+    def valid_moves(self, color=None):
+        if color is None:
+            color = self.turn
+        board = self.board
+        moves = []
+        append = moves.append
+        for sq in range(SQUARES):
+            piece = board[sq] * color
+            if piece <= 0:
+                continue
+            origin = sq << 5
+            if piece == PAWN:
+                target = PAWN_PUSH[color][sq]
+                if target >= 0 and board[target] == EMPTY:
+                    append(origin | target)
+                for target in PAWN_CAPTURES[color][sq]:
+                    if board[target] * color < 0:
+                        append(origin | target)
+            elif piece == KNIGHT or piece == KING:
+                for target in (KNIGHT_TARGETS[sq] if piece == KNIGHT else KING_TARGETS[sq]):
+                    if board[target] * color <= 0:
+                        append(origin | target)
+            else:
+                for ray in (BISHOP_RAYS[sq] if piece == BISHOP else QUEEN_RAYS[sq]):
+                    for target in ray:
+                        occupant = board[target] * color
+                        if occupant <= 0:
+                            append(origin | target)
+                        if occupant != EMPTY:
+                            break
+        return moves
+
+    """
+    Captures and promotions only, in the order valid_moves produces them
+
+    Args:
+        - color:    int | Side to generate moves for, defaults to the side to move
+    Returns:
+        - moves:    list | Encoded moves
+    """
+    def noisy_moves(self, color=None):
+        if color is None:
+            color = self.turn
+        board = self.board
+        promotion_row = PROMOTION_ROW[color]
+        moves = []
+        append = moves.append
+        for sq in range(SQUARES):
+            piece = board[sq] * color
+            if piece <= 0:
+                continue
+            origin = sq << 5
+            if piece == PAWN:
+                target = PAWN_PUSH[color][sq]
+                if target >= 0 and target // SIZE == promotion_row and board[target] == EMPTY:
+                    append(origin | target)
+                for target in PAWN_CAPTURES[color][sq]:
+                    if board[target] * color < 0:
+                        append(origin | target)
+            elif piece == KNIGHT or piece == KING:
+                for target in (KNIGHT_TARGETS[sq] if piece == KNIGHT else KING_TARGETS[sq]):
+                    if board[target] * color < 0:
+                        append(origin | target)
+            else:
+                for ray in (BISHOP_RAYS[sq] if piece == BISHOP else QUEEN_RAYS[sq]):
+                    for target in ray:
+                        occupant = board[target]
+                        if occupant != EMPTY:
+                            if occupant * color < 0:
+                                append(origin | target)
+                            break
+        return moves
+
+    """
+    Every move noisy_moves leaves out, in the order valid_moves produces them
+
+    Args:
+        - color:    int | Side to generate moves for, defaults to the side to move
+    Returns:
+        - moves:    list | Encoded moves
+    """
+    def quiet_moves(self, color=None):
+        if color is None:
+            color = self.turn
+        board = self.board
+        promotion_row = PROMOTION_ROW[color]
+        moves = []
+        append = moves.append
+        for sq in range(SQUARES):
+            piece = board[sq] * color
+            if piece <= 0:
+                continue
+            origin = sq << 5
+            if piece == PAWN:
+                target = PAWN_PUSH[color][sq]
+                if target >= 0 and target // SIZE != promotion_row and board[target] == EMPTY:
+                    append(origin | target)
+            elif piece == KNIGHT or piece == KING:
+                for target in (KNIGHT_TARGETS[sq] if piece == KNIGHT else KING_TARGETS[sq]):
+                    if board[target] == EMPTY:
+                        append(origin | target)
+            else:
+                for ray in (BISHOP_RAYS[sq] if piece == BISHOP else QUEEN_RAYS[sq]):
+                    for target in ray:
+                        if board[target] != EMPTY:
+                            break
+                        append(origin | target)
+        return moves
+
+    """
+    Yield moves in stages, captures and promotions first, then quiet moves.
+    Quiet moves are only generated once the caller asks past the first stage.
+
+    Args:
+        - color:    int | Side to generate moves for, defaults to the side to move
+    Returns:
+        - moves:    generator | Encoded moves
+    """
+    def staged_moves(self, color=None):
+        yield from self.noisy_moves(color)
+        yield from self.quiet_moves(color)
+
+    """
+    Whether a side has at least one move, stops at the first one found
+
+    Args:
+        - color:    int | Side to check, defaults to the side to move
+    Returns:
+        - bool
+    """
+    def has_any_move(self, color=None):
+        if color is None:
+            color = self.turn
+        board = self.board
+        for sq in range(SQUARES):
+            piece = board[sq] * color
+            if piece <= 0:
+                continue
+            if piece == PAWN:
+                target = PAWN_PUSH[color][sq]
+                if target >= 0 and board[target] == EMPTY:
+                    return True
+                for target in PAWN_CAPTURES[color][sq]:
+                    if board[target] * color < 0:
+                        return True
+            else:
+                # A slider can move at all only if the first square of one of its rays is free
+                targets = KNIGHT_TARGETS[sq] if piece == KNIGHT else BISHOP_STEPS[sq] if piece == BISHOP else KING_TARGETS[sq]
+                for target in targets:
+                    if board[target] * color <= 0:
+                        return True
+        return False
+
+    """
+    Whether an encoded move is valid for the side to move, without generating any moves.
+    Always agrees with `move in self.valid_moves()`.
+
+    Args:
+        - move: int | The encoded move
+    Returns:
+        - bool
+    """
+    def is_legal(self, move):
+        start, end = move >> 5, move & 31
+        if start >= SQUARES or end >= SQUARES:
+            return False
+        board = self.board
+        color = self.turn
+        piece = board[start] * color
+        if piece <= 0 or board[end] * color > 0:
+            return False
+        if piece == PAWN:
+            if end == PAWN_PUSH[color][start]:
+                return board[end] == EMPTY
+            return board[end] != EMPTY and end in PAWN_CAPTURES[color][start]
+        if piece == KNIGHT:
+            return end in KNIGHT_REACH[start]
+        if piece == KING:
+            return end in KING_REACH[start]
+        between = (BISHOP_BETWEEN if piece == BISHOP else QUEEN_BETWEEN)[start * SQUARES + end]
+        if between is None:
+            return False
+        for sq in between:
+            if board[sq] != EMPTY:
+                return False
+        return True
+
+    """
+    Whether a legal move is a capture or a promotion, i.e. one noisy_moves would generate
+
+    Args:
+        - move: int | The encoded move
+    Returns:
+        - bool
+    """
+    def is_noisy(self, move):
+        start, end = move >> 5, move & 31
+        if self.board[end] != EMPTY:
+            return True
+        return abs(self.board[start]) == PAWN and end // SIZE == PROMOTION_ROW[self.turn]
+
+    """
+    Count the valid moves of both sides without building move lists
+
+    Returns:
+        - mobility: int | White's move count minus black's move count
+    """
+    def mobility(self):
+        board = self.board
+        mobility = 0
+        for sq, piece in enumerate(board):
+            if piece == EMPTY:
+                continue
+            color = WHITE if piece > 0 else BLACK
+            piece *= color
+            count = 0
+            if piece == PAWN:
+                target = PAWN_PUSH[color][sq]
+                if target >= 0 and board[target] == EMPTY:
+                    count += 1
+                for target in PAWN_CAPTURES[color][sq]:
+                    if board[target] * color < 0:
+                        count += 1
+            elif piece == KNIGHT or piece == KING:
+                for target in (KNIGHT_TARGETS[sq] if piece == KNIGHT else KING_TARGETS[sq]):
+                    if board[target] * color <= 0:
+                        count += 1
+            else:
+                for ray in (BISHOP_RAYS[sq] if piece == BISHOP else QUEEN_RAYS[sq]):
+                    for target in ray:
+                        occupant = board[target] * color
+                        if occupant <= 0:
+                            count += 1
+                        if occupant != EMPTY:
+                            break
+            mobility += count if color == WHITE else -count
+        return mobility
+
+    """
+    Modify the position to make a move
+
+    Args:
+        - move: int | The encoded move to perform
+    Returns:
+        - undo: tuple | (captured piece, promoted, previous capture counter, previous outcome,
+                         previous hash, previous material, previous positional) for unmake_move
+    """
+    def make_move(self, move):
+        board = self.board
+        start, end = move >> 5, move & 31
+        moving_piece = board[start]
+        capt_piece = board[end]
+        undo = (capt_piece, False, self.capture, self.outcome, self.hash, self.material, self.positional)
+        self.positional -= PIECE_SQUARE[moving_piece][start]
+
+        # Turns since last capture
+        if capt_piece != EMPTY:
+            self.capture = self.turns + 1
+            self.material -= SIGNED_VALUES[capt_piece]
+            self.positional -= PIECE_SQUARE[capt_piece][end]
+            # King capture
+            if capt_piece == KING or capt_piece == -KING:
+                self.outcome = COLOR_NAMES[self.turn]
+
+        # Queening
+        if moving_piece * self.turn == PAWN and end // SIZE == PROMOTION_ROW[self.turn]:
+            moving_piece = QUEEN * self.turn
+            self.material += SIGNED_VALUES[moving_piece] - SIGNED_VALUES[board[start]]
+            undo = (capt_piece, True) + undo[2:]
+
+        self.positional += PIECE_SQUARE[moving_piece][end]
+        self.hash ^= ZOBRIST[board[start]][start] ^ ZOBRIST[capt_piece][end] ^ ZOBRIST[moving_piece][end] ^ ZOBRIST_BLACK
+        board[start] = EMPTY
+        board[end] = moving_piece
+        self.turn = -self.turn
+
+        return undo
+
+    """
+    Restore the position as it was before make_move
+
+    Args:
+        - move: int | The encoded move that was performed
+        - undo: tuple | The token returned by make_move
+    """
+    def unmake_move(self, move, undo):
+        board = self.board
+        start, end = move >> 5, move & 31
+        capt_piece, promoted, self.capture, self.outcome, self.hash, self.material, self.positional = undo
+        self.turn = -self.turn
+        board[start] = PAWN * self.turn if promoted else board[end]
+        board[end] = capt_piece
+
+    """
+    Pass the turn without moving, for null-move pruning. Undone by calling it again.
+    """
+    def make_null_move(self):
+        self.turn = -self.turn
+        self.hash ^= ZOBRIST_BLACK
+
+    """
+    Whether a side has a piece other than pawns and its king. Without one,
+    passing can be better than any move (zugzwang) and null moves are unsafe.
+
+    Args:
+        - color:    int | Side to check
+    Returns:
+        - bool
+    """
+    def has_pieces(self, color):
+        for piece in self.board:
+            if KNIGHT <= piece * color <= QUEEN:
+                return True
+        return False
@@ -0,0 +1,400 @@
+"""
+Endgame tablebases for every position with up to four pieces, kings included.
+
+Tables are solved offline by retrograde analysis and written to one binary
+file. The engine maps the file into memory and reads single bytes out of it,
+nothing is parsed or loaded up front besides the table directory.
+
+Each table covers one material set, e.g. KQvKP, with white holding the stronger
+side. Positions with the colors reversed are probed through the mirrored board.
+A position is indexed by the square of every piece in table order (white king,
+white pieces by descending code, black king, black pieces) in base 25, plus
+25^pieces when black is to move. Every index holds one signed byte for the
+side to move: n > 0 wins in n plies, n < 0 loses in -n plies, 0 is a draw or an
+impossible position. A game is won by capturing the king and a side without
+moves is scored as a draw.
+"""
+import os
+import mmap
+import struct
+import argparse
+from Position import (Position, decode_move, EMPTY, PAWN, KNIGHT, BISHOP, QUEEN, KING, WHITE, BLACK, SIZE, SQUARES,
+                      TEXT_LETTERS, KING_TARGETS, KNIGHT_TARGETS, BISHOP_RAYS, QUEEN_RAYS,
+                      PAWN_PUSH, PAWN_CAPTURES, PROMOTION_ROW)
+
+TABLEBASE_PIECES: int = 4
+TABLEBASE_FILE: str = os.path.join(os.path.dirname(os.path.abspath(__file__)), "tablebase.bin")
+TB_WIN: int = 500 # Score of a won table position, above any material balance and below a captured king
+
+MAGIC: bytes = b"GFTB"
+VERSION: int = 1
+HEADER = struct.Struct("<4sHH")     # magic, version, table count
+DIRECTORY = struct.Struct("<16sBQ") # table name, piece count, data offset
+EXTRAS: tuple = (QUEEN, BISHOP, KNIGHT, PAWN)
+
+def _flip_square(sq: int) -> int:
+    row, col = divmod(sq, SIZE)
+    return (SIZE - 1 - row) * SIZE + col
+
+def _side_key(codes):
+    return (len(codes), tuple(codes))
+
+"""
+Table name for a material set
+
+Args:
+    - white, black: tuple | Piece codes other than the king, by descending code
+Returns:
+    - name: string | e.g. KQPvK
+"""
+def table_name(white, black):
+    return 'K' + ''.join(TEXT_LETTERS[code] for code in white) + 'vK' + ''.join(TEXT_LETTERS[code] for code in black)
+
+"""
+Canonical material sets in an order where every table only depends on tables
+before it: captures lead to fewer pieces and queening to fewer pawns
+"""
+def material_tables(max_pieces=TABLEBASE_PIECES):
+    sides = [()]
+    for count in range(1, max_pieces - 1):
+        sides += [combo for combo in _combinations(count)]
+    tables = [(white, black) for white in sides for black in sides
+              if len(white) + len(black) <= max_pieces - 2 and _side_key(white) >= _side_key(black)]
+    tables.sort(key=lambda table: (len(table[0]) + len(table[1]), (table[0] + table[1]).count(PAWN)))
+    return tables
+
+def _combinations(count, start=0):
+    if count == 0:
+        return [()]
+    return [(EXTRAS[i],) + rest for i in range(start, len(EXTRAS)) for rest in _combinations(count - 1, i)]
+
+"""
+Read-only view of a tablebase file
+
+Args:
+    - path: string | File written by generate
+"""
+class Tablebase:
+    def __init__(self, path=TABLEBASE_FILE):
+        self.path = path
+        self.file = open(path, 'rb')
+        self.data = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, count = HEADER.unpack_from(self.data, 0)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"{path} is not a version {VERSION} tablebase file")
+        self.tables = {}
+        self.max_pieces = 0
+        for i in range(count):
+            name, pieces, offset = DIRECTORY.unpack_from(self.data, HEADER.size + i * DIRECTORY.size)
+            self.tables[name.rstrip(b'\0').decode()] = (offset, pieces)
+            self.max_pieces = max(self.max_pieces, pieces)
+        self.min_empty = SQUARES - self.max_pieces
+        self.probes = 0
+        self.hits = 0
+
+    """
+    Look up the side to move's result
+
+    Args:
+        - position: Position | Any position, games already decided and positions with too many pieces are not covered
+    Returns:
+        - value: int | Plies to the end, positive when the side to move wins, 0 for a draw, None if not covered
+    """
+    def probe(self, position):
+        board = position.board
+        # Counting empty squares runs in C, most positions in a search stop here
+        if board.count(EMPTY) < self.min_empty or position.outcome:
+            return None
+        self.probes += 1
+        white, black = [], []
+        for sq, piece in enumerate(board):
+            if piece > 0:
+                white.append((piece, sq))
+            elif piece < 0:
+                black.append((-piece, sq))
+        # Kings sort first, being the highest code
+        white.sort(reverse=True)
+        black.sort(reverse=True)
+        turn = position.turn
+        if _side_key([code for code, _ in white[1:]]) < _side_key([code for code, _ in black[1:]]):
+            white, black = ([(code, _flip_square(sq)) for code, sq in black],
+                            [(code, _flip_square(sq)) for code, sq in white])
+            turn = -turn
+        name = table_name([code for code, _ in white[1:]], [code for code, _ in black[1:]])
+        table = self.tables.get(name)
+        if table is None:
+            return None
+        offset, pieces = table
+        index = 0
+        for _, sq in white + black:
+            index = index * SQUARES + sq
+        if turn == BLACK:
+            index += SQUARES ** pieces
+        value = self.data[offset + index]
+        self.hits += 1
+        return value - 256 if value > 127 else value
+
+    """
+    Table value as a search score from white's point of view, shorter wins score higher
+    """
+    def score(self, value, turn):
+        if value == 0:
+            return 0
+        score = TB_WIN - value if value > 0 else -TB_WIN - value
+        return score * turn
+
+    """
+    Best move straight from the tables: the fastest win, else a draw, else the slowest loss
+
+    Returns:
+        - result: tuple | (move, value) with value from the side to move like probe, None if not covered
+    """
+    def best_move(self, position):
+        if self.probe(position) is None:
+            return None
+        best_move, best_rank, best_value = None, None, 0
+        for move in position.valid_moves():
+            undo = position.make_move(move)
+            if position.outcome:
+                value = 1
+            else:
+                # The child's value is for the opponent, one ply further away
+                value = self.probe(position)
+                value = 1 - value if value < 0 else -1 - value if value > 0 else 0
+            position.unmake_move(move, undo)
+            # Wins rank by speed, losses by how long they hold out
+            rank = (2, -value) if value > 0 else (1, 0) if value == 0 else (0, -value)
+            if best_rank is None or rank > best_rank:
+                best_move, best_rank, best_value = move, rank, value
+        return (best_move, best_value) if best_move is not None else None
+
+    def close(self):
+        self.data.close()
+        self.file.close()
+
+"""
+Solve every table up to max_pieces and write them to path. Needs NumPy, the
+tables are solved with array operations over all positions of a table at once.
+
+Args:
+    - path:         string | Output file
+    - max_pieces:   int | Largest piece count, kings included
+    - log:          function | Progress output
+"""
+def generate(path=TABLEBASE_FILE, max_pieces=TABLEBASE_PIECES, log=print):
+    import numpy as np
+
+    geometry = _geometry(np)
+    values = {}
+    for white, black in material_tables(max_pieces):
+        name = table_name(white, black)
+        values[name] = _solve(np, geometry, white, black, values)
+        table = values[name]
+        log(f'{name:<8} {len(table):>8} positions {int((table > 0).sum()):>8} won {int((table < 0).sum()):>8} lost '
+            f'longest win {int(table.max())} plies')
+
+    names = list(values)
+    offset = HEADER.size + DIRECTORY.size * len(names)
+    with open(path, 'wb') as out:
+        out.write(HEADER.pack(MAGIC, VERSION, len(names)))
+        for name in names:
+            out.write(DIRECTORY.pack(name.encode(), len(name) - 1, offset))
+            offset += len(values[name])
+        for name in names:
+            out.write(values[name].tobytes())
+
+"""
+Move geometry as boolean arrays indexed [from, to], and BETWEEN[a, b, c] true
+when c lies strictly between a and b on a line
+"""
+def _geometry(np):
+    def targets(table):
+        array = np.zeros((SQUARES, SQUARES), dtype=bool)
+        for sq, squares in enumerate(table):
+            array[sq, list(squares)] = True
+        return array
+
+    between = np.zeros((SQUARES, SQUARES, SQUARES), dtype=bool)
+    for sq, rays in enumerate(QUEEN_RAYS):
+        for ray in rays:
+            for i, target in enumerate(ray):
+                between[sq, target, list(ray[:i])] = True
+
+    geometry = {
+        KING: targets(KING_TARGETS),
+        KNIGHT: targets(KNIGHT_TARGETS),
+        BISHOP: targets([[target for ray in rays for target in ray] for rays in BISHOP_RAYS]),
+        QUEEN: targets([[target for ray in rays for target in ray] for rays in QUEEN_RAYS]),
+        "between": between,
+    }
+    for color in (WHITE, BLACK):
+        geometry["push", color] = targets([[target] if target >= 0 else [] for target in PAWN_PUSH[color]])
+        geometry["capture", color] = targets(PAWN_CAPTURES[color])
+    return geometry
+
+"""
+Index into the table of a material set, in any piece order and either color
+orientation, together with that table's values
+
+Args:
+    - pieces:   list | (color, code, squares) per piece, squares an array over the positions being mapped
+    - turn:     int | Side to move in the new positions
+Returns:
+    - values:   array | Values of the mapped positions from their side to move
+"""
+def _lookup(np, pieces, turn, values):
+    white = sorted((piece for piece in pieces if piece[0] == WHITE), key=lambda piece: -piece[1])
+    black = sorted((piece for piece in pieces if piece[0] == BLACK), key=lambda piece: -piece[1])
+    white_codes, black_codes = tuple(code for _, code, _ in white[1:]), tuple(code for _, code, _ in black[1:])
+    if _side_key(white_codes) < _side_key(black_codes):
+        flip = np.array([_flip_square(sq) for sq in range(SQUARES)])
+        white, black = ([(WHITE, code, flip[squares]) for _, code, squares in black],
+                        [(BLACK, code, flip[squares]) for _, code, squares in white])
+        white_codes, black_codes = black_codes, white_codes
+        turn = -turn
+    index = 0
+    for _, _, squares in white + black:
+        index = index * SQUARES + squares
+    if turn == BLACK:
+        index = index + SQUARES ** len(pieces)
+    return values[table_name(white_codes, black_codes)][index]
+
+"""
+Retrograde analysis of one table
+
+Every legal move of every position becomes an edge to a child. Children in
+this table are solved here, children in smaller tables or after queening are
+already known and point into a pool of constant values, as does a captured king.
+Positions then resolve ply by ply: a win in k needs one child lost in k - 1,
+a loss in k needs every child won in at most k - 1. What is left is drawn.
+"""
+def _solve(np, geometry, white, black, values):
+    slots = [(WHITE, KING)] + [(WHITE, code) for code in white] + [(BLACK, KING)] + [(BLACK, code) for code in black]
+    count = len(slots)
+    half = SQUARES ** count
+    size = 2 * half
+
+    index = np.arange(half, dtype=np.int64)
+    squares = [(index // SQUARES ** (count - 1 - i)) % SQUARES for i in range(count)]
+    valid = np.ones(half, dtype=bool)
+    for i in range(count):
+        for j in range(i + 1, count):
+            valid &= squares[i] != squares[j]
+        color, code = slots[i]
+        if code == PAWN:
+            valid &= squares[i] // SIZE != PROMOTION_ROW[color]
+
+    # Pool after the positions of this table: every stored byte value, then the captured king
+    pool = size
+    king_captured = size + 256
+    sources, children = [], []
+
+    # Children are given for the masked positions only
+    def add(mask, base, child):
+        sources.append(index[mask] + base)
+        children.append(child if isinstance(child, np.ndarray) else np.full(int(mask.sum()), child, dtype=np.int64))
+
+    def known(mask, pieces, turn):
+        pieces = [(c, k, s[mask] if isinstance(s, np.ndarray) else np.full(int(mask.sum()), s)) for c, k, s in pieces]
+        return pool + 128 + _lookup(np, pieces, turn, values).astype(np.int64)
+
+    for turn, base in ((WHITE, 0), (BLACK, half)):
+        for i, (color, code) in enumerate(slots):
+            if color != turn:
+                continue
+            others = [j for j in range(count) if j != i]
+            for target in range(SQUARES):
+                if code == PAWN:
+                    quiet = valid & geometry["push", color][squares[i], target]
+                    capture = valid & geometry["capture", color][squares[i], target]
+                else:
+                    quiet = valid & geometry[code][squares[i], target]
+                    if code == BISHOP or code == QUEEN:
+                        for j in others:
+                            quiet &= ~geometry["between"][squares[i], target, squares[j]]
+                    capture = quiet.copy()
+                for j in others:
+                    occupied = squares[j] == target
+                    quiet &= ~occupied
+                    if slots[j][0] == color:
+                        capture &= ~occupied
+
+                promoted = code == PAWN and target // SIZE == PROMOTION_ROW[color]
+                moved = [(c, k, target if n == i else squares[n]) for n, (c, k) in enumerate(slots)]
+                if promoted:
+                    moved[i] = (color, QUEEN, target)
+
+                # Quiet moves stay in this table unless a pawn queens
+                if quiet.any():
+                    if promoted:
+                        add(quiet, base, known(quiet, moved, -turn))
+                    else:
+                        child = index[quiet] + (target - squares[i][quiet]) * SQUARES ** (count - 1 - i)
+                        add(quiet, base, child + (half - base))
+
+                for j in others:
+                    if slots[j][0] == color:
+                        continue
+                    taken = capture & (squares[j] == target)
+                    if not taken.any():
+                        continue
+                    if slots[j][1] == KING:
+                        add(taken, base, king_captured)
+                        continue
+                    add(taken, base, known(taken, [piece for n, piece in enumerate(moved) if n != j], -turn))
+
+    sources = np.concatenate(sources)
+    children = np.concatenate(children)
+    degree = np.bincount(sources, minlength=size)
+
+    # Result (1 won, -1 lost, 0 open) and plies for the positions and the pool
+    result = np.zeros(size + 257, dtype=np.int8)
+    plies = np.zeros(size + 257, dtype=np.int16)
+    stored = np.arange(-128, 128)
+    result[pool:pool + 256] = np.sign(stored)
+    plies[pool:pool + 256] = np.abs(stored)
+    result[king_captured] = -1
+
+    last = int(plies[np.unique(children[children >= pool])].max(initial=0)) + 1
+    ply = 0
+    while True:
+        ply += 1
+        open_sources = result[sources] == 0
+        if ply % 2:
+            hit = open_sources & (result[children] == -1) & (plies[children] == ply - 1)
+            solved = np.unique(sources[hit])
+            result[solved] = 1
+        else:
+            won = open_sources & (result[children] == 1) & (plies[children] <= ply - 1)
+            solved = np.flatnonzero((np.bincount(sources[won], minlength=size) == degree) & (degree > 0) & (result[:size] == 0))
+            result[solved] = -1
+        plies[solved] = ply
+        if solved.size:
+            last = max(last, ply + 2)
+        elif ply > last:
+            break
+    if int(plies[:size].max()) > 127:
+        raise OverflowError(f"{table_name(white, black)} has a mate longer than 127 plies")
+    return (result[:size].astype(np.int16) * plies[:size]).astype(np.int8)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate or probe the endgame tablebases")
+    parser.add_argument("--generate", action="store_true", help="Solve every table and write the file")
+    parser.add_argument("--file", type=str, default=TABLEBASE_FILE, help="Tablebase file (default: tablebase.bin next to this script)")
+    parser.add_argument("--pieces", type=int, default=TABLEBASE_PIECES, help=f"Largest piece count, kings included (default: {TABLEBASE_PIECES})")
+    parser.add_argument("--probe", type=str, help="Position to look up in the text notation, e.g. 'k4/5/5/2Q2/4K w'")
+    args = parser.parse_args()
+
+    if args.generate:
+        generate(args.file, args.pieces)
+    if args.probe:
+        tablebase = Tablebase(args.file)
+        position = Position.from_text(args.probe)
+        value = tablebase.probe(position)
+        if value is None:
+            print("Not in the tables")
+        else:
+            result = f'wins in {value} plies' if value > 0 else f'loses in {-value} plies' if value < 0 else 'draws'
+            best = tablebase.best_move(position)
+            notation = ' '.join(f'{chr(col + ord("A"))}{SIZE - row}' for row, col in decode_move(best[0])) if best else None
+            print(f'Side to move {result}' + (f', best move {notation}' if best else ''))
@@ -0,0 +1,153 @@
+import json
+import time
+from MoveOrdering import MAX_PLY
+
+COUNTERS: list = ["nodes", "cutoffs", "timing", "cache", "pv"]
+
+"""
+Optional per-move search counters
+
+Every counter is off unless named. The search only checks `stats is not None`
+and one flag per site, and the timing counter works by swapping in timed
+wrappers for move generation and evaluation, so disabled counters cost next
+to nothing.
+
+    nodes:   nodes visited and evaluated per ply, per-iteration node counts
+    cutoffs: alpha-beta cutoffs and effective branching factor, total nodes ** (1 / depth)
+    timing:  time spent in move generation, evaluation and the whole search
+    cache:   transposition table and mobility cache hit rates of this search
+    pv:      principal variation and its score
+
+Args:
+    - counters: iterable | Names from COUNTERS
+"""
+class SearchStats:
+    def __init__(self, counters):
+        unknown = set(counters) - set(COUNTERS)
+        if unknown:
+            raise ValueError(f"Unknown counters {', '.join(sorted(unknown))}, expected {', '.join(COUNTERS)}")
+        self.counters = [name for name in COUNTERS if name in counters]
+        self.count_nodes = "nodes" in counters
+        self.count_cutoffs = "cutoffs" in counters
+        self.timing = "timing" in counters
+        self.cache = "cache" in counters
+        self.pv = "pv" in counters
+        self.reset()
+
+    """
+    Clear the counters before a search
+
+    Args:
+        - engine: Minimax | The engine about to search, its cache counters run
+                            across searches and are read from here on
+    """
+    def reset(self, engine=None):
+        self.visited = [0] * MAX_PLY
+        self.evaluated = [0] * MAX_PLY
+        self.iteration_nodes = []
+        self.cutoffs = 0
+        self.movegen_time = 0.0
+        self.eval_time = 0.0
+        # The table lives across turns and the evaluator is shared by both players
+        tt = engine.tt if engine is not None else None
+        evaluator = engine.evaluator if engine is not None else None
+        self.tt_counts = (tt.hits, tt.probes) if tt is not None else (0, 0)
+        self.mobility_counts = (evaluator.mobility_hits, evaluator.mobility_probes) if evaluator is not None else (0, 0)
+
+    """
+    Wrap move generation and evaluation with timers when timing is on
+
+    Args:
+        - generate: function | Move generator taking a Position
+        - evaluate: function | Evaluation taking a Position
+        - stages:   functions | More move generators, timed like generate
+    Returns:
+        - (generate, evaluate, *stages): tuple | The functions to call during the search
+    """
+    def instrument(self, generate, evaluate, *stages):
+        if not self.timing:
+            return (generate, evaluate, *stages)
+        clock = time.perf_counter
+
+        def timed(generate):
+            def timed_generate(position):
+                start = clock()
+                moves = generate(position)
+                self.movegen_time += clock() - start
+                return moves
+            return timed_generate
+
+        def timed_evaluate(position):
+            start = clock()
+            score = evaluate(position)
+            self.eval_time += clock() - start
+            return score
+
+        return (timed(generate), timed_evaluate, *map(timed, stages))
+
+    """
+    Build the per-move record
+
+    Args:
+        - engine:   Minimax | The engine after find_move returned
+        - move:     string | The move played in letter number form
+        - seconds:  float | Wall time of the search
+    Returns:
+        - record:   dict | JSON-serializable stats, only enabled counters are present
+    """
+    def record(self, engine, move, seconds):
+        record = {
+            "move": move,
+            "depth": engine.depth_reached,
+            "nodes": engine.total_nodes,
+            "seconds": round(seconds, 6),
+        }
+        depth = engine.depth_reached
+        if self.count_nodes:
+            record["visited_per_ply"] = self.visited[:depth + 1]
+            record["evaluated_per_ply"] = self.evaluated[:depth + 1]
+            record["iteration_nodes"] = self.iteration_nodes
+        if self.count_cutoffs:
+            record["cutoffs"] = self.cutoffs
+            # Iterations cut short by the table make the ratio of the last two meaningless
+            record["branching_factor"] = round(engine.total_nodes ** (1 / depth), 3) if depth and engine.total_nodes else None
+        if self.timing:
+            record["movegen_seconds"] = round(self.movegen_time, 6)
+            record["eval_seconds"] = round(self.eval_time, 6)
+            record["search_seconds"] = round(seconds - self.movegen_time - self.eval_time, 6)
+        if self.cache:
+            tt = engine.tt
+            evaluator = engine.evaluator
+            record["tt_hit_rate"] = self.hit_rate(tt.hits, tt.probes, self.tt_counts) if tt is not None else None
+            record["mobility_cache_hit_rate"] = \
+                self.hit_rate(evaluator.mobility_hits, evaluator.mobility_probes, self.mobility_counts)
+        if self.pv:
+            record["pv"] = engine.principal_variation()
+            record["score"] = engine.root_score
+        return record
+
+    # Hits over probes since the search started, None without a probe
+    def hit_rate(self, hits, probes, start):
+        hits, probes = hits - start[0], probes - start[1]
+        return round(hits / probes, 4) if probes > 0 else None
+
+    """
+    One line summary for the game log
+    """
+    def summary(self, record):
+        parts = [f'depth {record["depth"]}', f'{record["nodes"]} nodes',
+                 f'{record["nodes"] / record["seconds"]:.0f} nodes/s' if record["seconds"] else '']
+        if record.get("branching_factor"):
+            parts.append(f'ebf {record["branching_factor"]}')
+        if "cutoffs" in record:
+            parts.append(f'{record["cutoffs"]} cutoffs')
+        if self.timing:
+            parts.append(f'movegen {record["movegen_seconds"]:.3f}s eval {record["eval_seconds"]:.3f}s')
+        if record.get("tt_hit_rate") is not None:
+            parts.append(f'tt {record["tt_hit_rate"]:.1%}')
+        if "pv" in record:
+            parts.append(f'score {record["score"]} pv {" ".join(record["pv"])}')
+        return 'Search: ' + ', '.join(part for part in parts if part)
+
+    def to_json(self, record):
+        return json.dumps(record)
@@ -0,0 +1,239 @@
+import math
+import time
+import random
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+from Heuristics import HeuristicsEvaluator, HEURISTICS, WEIGHTS_FILE, load_weights
+from Minimax import Minimax, MAX_DEPTH, QUIESCENCE_NODES, ASPIRATION_WINDOW
+from MoveOrdering import MoveOrderer
+from Position import Position, WHITE, BLACK
+from TranspositionTable import TranspositionTable
+from Tablebase import Tablebase
+
+"""
+Engine configuration for headless games
+
+Built from a comma separated spec such as "heuristic=e2,alpha_beta=1,time=0.5"
+or "heuristic=e0,depth=3". Without a depth the engine deepens iteratively
+within its time budget, like the AI player.
+"""
+class EngineConfig:
+    FIELDS: dict = {
+        "heuristic": str,
+        "alpha_beta": lambda value: bool(int(value)),
+        "depth": int,
+        "time": float,
+        "tt_mb": int,
+        "ordering": lambda value: bool(int(value)),
+        "qs_nodes": int,
+        "tablebase": str,
+        "pvs": lambda value: bool(int(value)),
+        "aspiration": float,
+        "null_move": int,
+        "lmr": int,
+        "futility": float,
+        "weights": str,
+    }
+
+    def __init__(self, heuristic="e0", alpha_beta=True, depth=None, time=1.0, tt_mb=16, ordering=True, qs_nodes=QUIESCENCE_NODES, tablebase=None,
+                 pvs=False, aspiration=ASPIRATION_WINDOW, null_move=0, lmr=0, futility=0, weights=WEIGHTS_FILE):
+        if heuristic not in HEURISTICS:
+            raise ValueError(f"Unknown heuristic {heuristic}, expected one of {', '.join(HEURISTICS)}")
+        # A missing or incomplete weights file is reported here, not when a worker builds the engine
+        if heuristic == "e4":
+            load_weights(weights)
+        self.heuristic = heuristic
+        self.alpha_beta = alpha_beta
+        self.depth = depth
+        self.time = time
+        self.tt_mb = tt_mb
+        self.ordering = ordering
+        self.qs_nodes = qs_nodes
+        self.tablebase = tablebase
+        self.pvs = pvs
+        self.aspiration = aspiration
+        self.null_move = null_move
+        self.lmr = lmr
+        self.futility = futility
+        self.weights = weights
+
+    @classmethod
+    def parse(cls, spec):
+        values = {}
+        for field in filter(None, spec.split(",")):
+            name, _, value = field.partition("=")
+            if name not in cls.FIELDS:
+                raise ValueError(f"Unknown engine option {name}, expected one of {', '.join(cls.FIELDS)}")
+            values[name] = cls.FIELDS[name](value)
+        return cls(**values)
+
+    # parse as an argparse type, so the reason a spec is invalid reaches the user
+    @classmethod
+    def argument(cls, spec):
+        try:
+            return cls.parse(spec)
+        except ValueError as error:
+            raise argparse.ArgumentTypeError(str(error)) from None
+
+    def build(self):
+        evaluator = HeuristicsEvaluator(None, self.heuristic, weights=self.weights)
+        return Minimax(None, evaluator, self.alpha_beta, self.time, "dfs", MAX_DEPTH,
+                       TranspositionTable(self.tt_mb) if self.tt_mb > 0 else None,
+                       MoveOrderer() if self.ordering else None, None, self.qs_nodes,
+                       Tablebase(self.tablebase) if self.tablebase else None, False, self.pvs, self.aspiration,
+                       self.null_move, self.lmr, self.futility)
+
+    def __str__(self):
+        limit = f'depth={self.depth}' if self.depth else f'time={self.time}'
+        tablebase = f',tablebase={self.tablebase}' if self.tablebase else ''
+        pvs = f',pvs=1,aspiration={self.aspiration}' if self.pvs else ''
+        selective = ''.join(f',{name}={getattr(self, name)}' for name in ('null_move', 'lmr', 'futility') if getattr(self, name))
+        weights = f',weights={self.weights}' if self.heuristic == 'e4' else ''
+        return f'heuristic={self.heuristic}{weights},alpha_beta={int(self.alpha_beta)},{limit},qs_nodes={self.qs_nodes}{tablebase}{pvs}{selective}'
+
+"""
+Opening positions
+
+Every distinct position two plies from the start, sampled with a fixed seed
+so both engines see the same set on every run.
+
+Args:
+    - count:    int | Number of openings
+    - seed:     int | Sampling seed
+Returns:
+    - openings: list | Positions, white to move
+"""
+def generate_openings(count, seed=0):
+    from MiniChess import MiniChess
+    start = Position.from_state(MiniChess.init_board())
+    openings = {}
+    for first in start.valid_moves():
+        undo_first = start.make_move(first)
+        for reply in start.valid_moves():
+            undo_reply = start.make_move(reply)
+            if not start.outcome:
+                openings.setdefault(start.hash, start.copy())
+            start.unmake_move(reply, undo_reply)
+        start.unmake_move(first, undo_first)
+
+    openings = [openings[key] for key in sorted(openings)]
+    random.Random(seed).shuffle(openings)
+    for position in openings:
+        position.turns, position.capture = 2, 0
+    return openings[:count]
+
+"""
+Play one game without display or logging
+
+Follows the rules of MiniChess.play: the turn counter advances after black
+moves and the game is drawn once max_turns pass without a capture.
+
+Args:
+    - white, black: EngineConfig | Engines for each side
+    - opening:      Position | Starting position
+    - max_turns:    int | Turns without capture before a draw
+Returns:
+    - result:       tuple | (outcome, stats) outcome is 'white', 'black' or 'draw',
+                            stats maps color to (moves, nodes, seconds, depth total)
+"""
+def play_game(white, black, opening, max_turns):
+    position = opening.copy()
+    engines = {WHITE: white.build(), BLACK: black.build()}
+    depths = {WHITE: white.depth, BLACK: black.depth}
+    stats = {WHITE: [0, 0, 0.0, 0], BLACK: [0, 0, 0.0, 0]}
+
+    while True:
+        if position.turns - position.capture >= max_turns:
+            return 'draw', stats
+        if position.outcome:
+            return position.outcome, stats
+
+        engine = engines[position.turn]
+        start = time.time()
+        move = engine.find_move(position, depths[position.turn], position.turn == WHITE)
+        if move is None:
+            return 'draw', stats
+        side = stats[position.turn]
+        side[0] += 1
+        side[1] += engine.total_nodes
+        side[2] += time.time() - start
+        side[3] += engine.depth_reached
+
+        position.make_move(move)
+        if position.turn == WHITE:
+            position.turns += 1
+
+def _play_task(task):
+    config_a, config_b, opening, max_turns, a_is_white = task
+    white, black = (config_a, config_b) if a_is_white else (config_b, config_a)
+    outcome, stats = play_game(white, black, opening, max_turns)
+    a_color = WHITE if a_is_white else BLACK
+    score = 0.5 if outcome == 'draw' else float((outcome == 'white') == a_is_white)
+    return score, stats[a_color], stats[-a_color]
+
+"""
+Elo difference from a score fraction, with a 95% confidence interval
+
+Args:
+    - scores:   list | Per game score of engine A (1, 0.5 or 0)
+Returns:
+    - elo:      tuple | (elo, low, high)
+"""
+def elo_difference(scores):
+    def elo(score):
+        score = min(max(score, 1e-6), 1 - 1e-6)
+        return -400 * math.log10(1 / score - 1)
+
+    n = len(scores)
+    mean = sum(scores) / n
+    variance = sum((score - mean) ** 2 for score in scores) / n
+    margin = 1.96 * math.sqrt(variance / n)
+    return elo(mean), elo(mean - margin), elo(mean + margin)
+
+"""
+Play a match in parallel worker processes, every opening once with each color
+
+Returns:
+    - report:   dict | Wins, draws and losses of A, per engine speed and depth, and the Elo estimate
+"""
+def run_match(config_a, config_b, games, max_turns, processes=None, seed=0):
+    openings = generate_openings((games + 1) // 2, seed)
+    tasks = [(config_a, config_b, opening, max_turns, a_is_white)
+             for opening in openings for a_is_white in (True, False)][:games]
+
+    with ProcessPoolExecutor(max_workers=processes) as pool:
+        results = list(pool.map(_play_task, tasks))
+
+    scores = [score for score, _, _ in results]
+    report = {
+        "games": len(scores),
+        "wins": scores.count(1.0),
+        "draws": scores.count(0.5),
+        "losses": scores.count(0.0),
+    }
+    for name, index in (("a", 1), ("b", 2)):
+        moves, nodes, seconds, depth = (sum(values) for values in zip(*(result[index] for result in results)))
+        report[f"{name}_nps"] = nodes / seconds if seconds else 0.0
+        report[f"{name}_depth"] = depth / moves if moves else 0.0
+    report["elo"], report["elo_low"], report["elo_high"] = elo_difference(scores)
+    return report
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Headless engine-vs-engine match")
+    parser.add_argument("engine_a", type=EngineConfig.argument, help="Engine A, e.g. heuristic=e2,alpha_beta=1,time=0.5")
+    parser.add_argument("engine_b", type=EngineConfig.argument, help="Engine B, e.g. heuristic=e0,depth=3")
+    parser.add_argument("--games", type=int, default=20, help="Number of games, openings are played with colors swapped (default: 20)")
+    parser.add_argument("--max-turns", type=int, default=40, help="Turns without capture before a draw (default: 40)")
+    parser.add_argument("--processes", type=int, default=None, help="Worker processes (default: one per core)")
+    parser.add_argument("--seed", type=int, default=0, help="Opening sampling seed (default: 0)")
+    args = parser.parse_args()
+
+    start = time.time()
+    report = run_match(args.engine_a, args.engine_b, args.games, args.max_turns, args.processes, args.seed)
+    print(f'A: {args.engine_a}')
+    print(f'B: {args.engine_b}')
+    print(f'{report["games"]} games in {time.time() - start:.1f}s: '
+          f'+{report["wins"]} ={report["draws"]} -{report["losses"]} for A')
+    print(f'A: {report["a_nps"]:.0f} nodes/s, average depth {report["a_depth"]:.2f}')
+    print(f'B: {report["b_nps"]:.0f} nodes/s, average depth {report["b_depth"]:.2f}')
+    print(f'Elo A - B: {report["elo"]:+.0f} (95% interval {report["elo_low"]:+.0f} to {report["elo_high"]:+.0f})')
@@ -0,0 +1,93 @@
+from array import array
+
+# Bound types, 0 marks an empty slot
+EXACT: int = 1
+LOWER: int = 2 # score is a lower bound (the search failed high)
+UPPER: int = 3 # score is an upper bound (the search failed low)
+
+# key (8) + score (8) + depth (1) + flag (1) + move (2) + age (1)
+ENTRY_BYTES: int = 21
+
+"""
+Fixed-size transposition table keyed by Zobrist hash
+
+Entries live in parallel typed arrays, so the memory used is known up
+front and nothing is allocated per store. Each hash maps to one slot.
+A slot is replaced when it is empty, holds the same position, was
+written by an older search, or holds a result that is not deeper.
+
+Args:
+    - megabytes: int | Memory cap, the slot count is the largest power of two that fits
+"""
+class TranspositionTable:
+    def __init__(self, megabytes=16):
+        size = 1
+        while size * 2 * ENTRY_BYTES <= megabytes * 2**20:
+            size *= 2
+        self.size = size
+        self.mask = size - 1
+        self.keys = array('Q', [0]) * size
+        self.scores = array('d', [0.0]) * size
+        self.depths = array('b', [0]) * size
+        self.flags = array('B', [0]) * size
+        self.moves = array('H', [0]) * size
+        self.ages = array('B', [0]) * size
+        self.age = 0
+        self.probes = 0
+        self.hits = 0
+
+    """
+    Start a new search, entries from earlier searches become replaceable
+    """
+    def new_search(self):
+        self.age = (self.age + 1) & 255
+
+    """
+    Look a position up
+
+    Args:
+        - key:  int | Zobrist hash of the position
+    Returns:
+        - entry: tuple | (depth, score, flag, move), None when the position is not stored
+    """
+    def probe(self, key):
+        self.probes += 1
+        slot = key & self.mask
+        if self.flags[slot] and self.keys[slot] == key:
+            self.hits += 1
+            return (self.depths[slot], self.scores[slot], self.flags[slot], self.moves[slot])
+        return None
+
+    """
+    Best move stored for a position without counting as a probe, 0 if none
+    """
+    def best_move(self, key):
+        slot = key & self.mask
+        return self.moves[slot] if self.flags[slot] and self.keys[slot] == key else 0
+
+    """
+    Store a search result
+
+    Args:
+        - key:      int | Zobrist hash of the position
+        - depth:    int | Remaining depth the score was searched to
+        - score:    float | Score from white's point of view
+        - flag:     int | EXACT, LOWER or UPPER
+        - move:     int | Best encoded move, 0 if none
+    """
+    def store(self, key, depth, score, flag, move):
+        slot = key & self.mask
+        if self.flags[slot] and self.keys[slot] != key and \
+           self.ages[slot] == self.age and self.depths[slot] > depth:
+            return
+        self.keys[slot] = key
+        self.scores[slot] = score
+        self.depths[slot] = depth
+        self.flags[slot] = flag
+        self.moves[slot] = move
+        self.ages[slot] = self.age
+
+    def clear(self):
+        for table in (self.keys, self.scores, self.depths, self.flags, self.moves, self.ages):
+            table[:] = array(table.typecode, [0]) * self.size
+        self.probes = self.hits = 0
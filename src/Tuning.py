@@ -0,0 +1,250 @@
+"""
+Self-play data and Texel tuning of the e4 evaluation weights.
+
+Self-play games append their quiet positions, each labelled with the game's
+result, to a flat binary file of fixed size records. The file only grows, a new
+run adds to the positions already there, and nothing is kept in memory besides
+the games in flight.
+
+Tuning maps that file with NumPy and fits the FEATURES weights so that
+sigmoid(K * score) predicts the result, by mini-batch gradient descent on the
+squared error. K is fitted first with the starting weights and then held, so
+the tuned weights stay in the units of the hand-written heuristics. Positions
+are read a batch at a time, memory stays bounded however large the corpus is.
+"""
+import os
+import json
+import math
+import time
+import random
+import struct
+import argparse
+import tempfile
+from concurrent.futures import ProcessPoolExecutor, wait, as_completed, FIRST_COMPLETED
+from Heuristics import FEATURES, WEIGHTS_FILE, load_weights
+from Position import WHITE, SQUARES
+from Tournament import EngineConfig, generate_openings
+
+DATA_FILE: str = os.path.join(os.path.dirname(os.path.abspath(__file__)), "selfplay.bin")
+SELF_PLAY_ENGINE: str = "heuristic=e2,depth=3,tt_mb=4"
+RANDOM_PLIES: int = 4      # Random moves after the opening, so games do not repeat
+TUNING_BATCH: int = 16384  # Positions per gradient step
+K_RANGE: tuple = (0.01, 10) # Search interval of the sigmoid scale
+
+MAGIC: bytes = b"GFSP"
+VERSION: int = 1
+HEADER = struct.Struct("<4sH")               # magic, version
+RECORD = struct.Struct(f"<{SQUARES}bbb")     # board, side to move, result from white's point of view
+
+"""
+Play one self-play game and pack its quiet positions
+
+A position is recorded when the side to move has no capture or promotion, so
+its static score is not in the middle of an exchange. The random plies at the
+start are not recorded.
+
+Args:
+    - task: tuple | (config, opening, max_turns, seed), seed is any value random.Random accepts
+Returns:
+    - records: bytes | Packed RECORDs, result 1 white won, -1 black won, 0 draw
+"""
+def _play_task(task):
+    config, opening, max_turns, seed = task
+    rng = random.Random(seed)
+    engine = config.build()
+    position = opening.copy()
+    positions = []
+    ply = 0
+    while True:
+        if position.turns - position.capture >= max_turns:
+            outcome = 'draw'
+            break
+        if position.outcome:
+            outcome = position.outcome
+            break
+        if ply < RANDOM_PLIES:
+            moves = position.valid_moves()
+            move = rng.choice(moves) if moves else None
+        else:
+            if not position.noisy_moves():
+                positions.append((tuple(position.board), position.turn))
+            move = engine.find_move(position, config.depth, position.turn == WHITE)
+        if move is None:
+            outcome = 'draw'
+            break
+        position.make_move(move)
+        if position.turn == WHITE:
+            position.turns += 1
+        ply += 1
+
+    result = 1 if outcome == 'white' else -1 if outcome == 'black' else 0
+    return b''.join(RECORD.pack(*board, turn, result) for board, turn in positions)
+
+"""
+Play self-play games in worker processes and append their positions to path
+
+Games finish in any order and are written as they finish, at most two per
+process are in flight at a time.
+
+Args:
+    - path:         string | Data file, created when missing
+    - games:        int | Number of games
+    - config:       EngineConfig | Engine for both sides, with a fixed depth for speed
+    - max_turns:    int | Turns without capture before a draw
+    - processes:    int | Worker processes, None for one per core
+    - seed:         int | Opening and random move seed
+    - log:          function | Progress output
+"""
+def generate(path=DATA_FILE, games=1000, config=None, max_turns=40, processes=None, seed=0, log=print):
+    config = config or EngineConfig.parse(SELF_PLAY_ENGINE)
+    openings = generate_openings(games, seed)
+    start = time.time()
+    written = [0, 0] # games, positions
+
+    def collect(futures, out):
+        for future in futures:
+            data = future.result()
+            out.write(data)
+            written[0] += 1
+            written[1] += len(data) // RECORD.size
+            if written[0] % 100 == 0:
+                log(f'{written[0]}/{games} games, {written[1]} positions, {time.time() - start:.0f}s')
+
+    with open(path, 'ab') as out, ProcessPoolExecutor(max_workers=processes) as pool:
+        if out.tell() == 0:
+            out.write(HEADER.pack(MAGIC, VERSION))
+        else:
+            _check_header(path)
+        window = 2 * (processes or os.cpu_count())
+        pending = set()
+        for game in range(games):
+            if len(pending) >= window:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                collect(done, out)
+            task = (config, openings[game % len(openings)], max_turns, f'{seed}/{game}')
+            pending.add(pool.submit(_play_task, task))
+        collect(as_completed(pending), out)
+    log(f'{games} games, {written[1]} positions appended to {path} in {time.time() - start:.1f}s')
+
+def _check_header(path):
+    with open(path, 'rb') as data:
+        magic, version = HEADER.unpack(data.read(HEADER.size))
+    if magic != MAGIC or version != VERSION:
+        raise ValueError(f"{path} is not a version {VERSION} self-play file")
+
+"""
+Map a data file as a NumPy record array, nothing is read until it is indexed
+
+Returns:
+    - records: memmap | Fields board (int8 x 25), turn and result (int8)
+"""
+def load(path=DATA_FILE):
+    import numpy as np
+    _check_header(path)
+    dtype = np.dtype([("board", np.int8, (SQUARES,)), ("turn", np.int8), ("result", np.int8)])
+    count = (os.path.getsize(path) - HEADER.size) // dtype.itemsize
+    return np.memmap(path, dtype=dtype, mode='r', offset=HEADER.size, shape=(count,))
+
+"""
+Fit the e4 weights to a data file and write them as JSON
+
+The features of every position are computed once, a batch at a time, into a
+temporary memory-mapped file next to the data. Adam steps over shuffled
+batches then minimize mean((target - sigmoid(K * features @ weights))^2),
+target being 1, 0.5 or 0 for a white win, draw or black win.
+
+Args:
+    - path:             string | Data file written by generate
+    - output:           string | Weights file for --weights
+    - epochs:           int | Passes over the data
+    - batch:            int | Positions per gradient step
+    - learning_rate:    float | Adam step size, in weight units
+    - start:            string | Weights file to start from, None for DEFAULT_WEIGHTS
+    - log:              function | Progress output
+Returns:
+    - weights: dict | Fitted weight per feature
+"""
+def tune(path=DATA_FILE, output=WEIGHTS_FILE, epochs=20, batch=TUNING_BATCH, learning_rate=0.01, start=None, log=print):
+    import numpy as np
+    from Heuristics import batch_features
+    records = load(path)
+    count = len(records)
+    if not count:
+        raise ValueError(f"{path} has no positions, run --generate first")
+    started = time.time()
+
+    with tempfile.TemporaryFile(dir=os.path.dirname(os.path.abspath(path))) as scratch:
+        features = np.memmap(scratch, dtype=np.float32, mode='w+', shape=(count, len(FEATURES)))
+        targets = np.memmap(scratch, dtype=np.float32, mode='w+', shape=(count,),
+                            offset=features.nbytes)
+        for low in range(0, count, batch):
+            chunk = records[low:low + batch]
+            features[low:low + batch] = batch_features(np.asarray(chunk["board"]))
+            targets[low:low + batch] = (chunk["result"] + 1) / 2
+        log(f'{count} positions, features in {time.time() - started:.1f}s')
+
+        def batches(order=None):
+            for index in (order if order is not None else range(0, count, batch)):
+                yield features[index:index + batch].astype(np.float64), targets[index:index + batch].astype(np.float64)
+
+        def error(weights, k):
+            total = 0.0
+            for x, target in batches():
+                total += ((target - 1 / (1 + np.exp(-k * (x @ weights)))) ** 2).sum()
+            return total / count
+
+        weights = np.array(load_weights(start), dtype=np.float64)
+        # Golden section search of K, the error is unimodal in K
+        low, high = K_RANGE
+        ratio = (math.sqrt(5) - 1) / 2
+        for _ in range(30):
+            left, right = high - ratio * (high - low), low + ratio * (high - low)
+            if error(weights, left) < error(weights, right):
+                high = right
+            else:
+                low = left
+        k = (low + high) / 2
+        log(f'K {k:.4f}, error {error(weights, k):.6f} with the starting weights')
+
+        rng = np.random.default_rng(0)
+        moment, velocity, step = np.zeros_like(weights), np.zeros_like(weights), 0
+        for epoch in range(epochs):
+            for x, target in batches(rng.permutation(np.arange(0, count, batch))):
+                predicted = 1 / (1 + np.exp(-k * (x @ weights)))
+                gradient = x.T @ ((predicted - target) * predicted * (1 - predicted)) * (2 * k / len(target))
+                step += 1
+                moment = 0.9 * moment + 0.1 * gradient
+                velocity = 0.999 * velocity + 0.001 * gradient ** 2
+                weights -= learning_rate * (moment / (1 - 0.9 ** step)) / (np.sqrt(velocity / (1 - 0.999 ** step)) + 1e-8)
+            log(f'epoch {epoch + 1}: error {error(weights, k):.6f} ' +
+                ' '.join(f'{name} {weight:.3f}' for name, weight in zip(FEATURES, weights)))
+        final_error = error(weights, k)
+        del features, targets
+
+    fitted = {name: round(float(weight), 4) for name, weight in zip(FEATURES, weights)}
+    with open(output, 'w') as out:
+        json.dump({"weights": fitted, "k": k, "error": final_error, "positions": count}, out, indent=2)
+    log(f'Weights written to {output} in {time.time() - started:.1f}s')
+    return fitted
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate self-play data and tune the e4 heuristic weights")
+    parser.add_argument("--generate", action="store_true", help="Play self-play games and append their positions to the data file")
+    parser.add_argument("--tune", action="store_true", help="Fit the weights to the data file and write the weights file")
+    parser.add_argument("--data", type=str, default=DATA_FILE, help="Self-play data file (default: selfplay.bin next to this script)")
+    parser.add_argument("--output", type=str, default=WEIGHTS_FILE, help="Weights file (default: weights.json next to this script)")
+    parser.add_argument("--games", type=int, default=1000, help="Self-play games to add (default: 1000)")
+    parser.add_argument("--engine", type=EngineConfig.argument, default=SELF_PLAY_ENGINE, help=f"Self-play engine (default: {SELF_PLAY_ENGINE})")
+    parser.add_argument("--max-turns", type=int, default=40, help="Turns without capture before a draw (default: 40)")
+    parser.add_argument("--processes", type=int, default=None, help="Self-play worker processes (default: one per core)")
+    parser.add_argument("--seed", type=int, default=0, help="Opening and random move seed, use a new one for each run (default: 0)")
+    parser.add_argument("--epochs", type=int, default=20, help="Passes over the data (default: 20)")
+    parser.add_argument("--batch", type=int, default=TUNING_BATCH, help=f"Positions per gradient step (default: {TUNING_BATCH})")
+    parser.add_argument("--learning-rate", type=float, default=0.01, help="Adam step size (default: 0.01)")
+    parser.add_argument("--start", type=str, default=None, help="Weights file to start from (default: the e2 weights)")
+    args = parser.parse_args()
+
+    if args.generate:
+        generate(args.data, args.games, args.engine, args.max_turns, args.processes, args.seed)
+    if args.tune:
+        tune(args.data, args.output, args.epochs, args.batch, args.learning_rate, args.start)